@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import json
+import os
+import re
+import sys
+from collections.abc import MutableMapping
+
+from navcache import fileFingerprint, fingerprintMatches
+from navparse import parseChunk
+
+## Format version of the index file. Bump it whenever the format changes.
+INDEX_VERSION = 1
+
+# Airport header rows: land airports, seaplane bases and heliports
+_HEADER = re.compile(rb'^[ \t]*(?:1|16|17)[ \t]', re.MULTILINE)
+
+# Size of the blocks apt.dat is read in while indexing, in bytes
+_BLOCK_SIZE = 1 << 20
+
+## Index of the airports in apt.dat by code, giving the byte range of each airport's rows so that
+#  an airport can be parsed on its own.
+class AirportIndex:
+	## Constructor.
+	#  \param path Path to apt.dat.
+	#  \param ranges Dict of airport code -> list of (start, end) byte ranges, in file order.
+	#  \param source Fingerprint of apt.dat the ranges were found in.
+	def __init__(self, path, ranges, source):
+		self.path = path
+		self.ranges = ranges
+		self.source = source
+
+	## Scans apt.dat for the airport header rows. The file is read a block at a time rather than
+	#  all at once.
+	#  \param path Path to apt.dat.
+	@classmethod
+	def build(cls, path):
+		source = fileFingerprint(path)
+		starts = [ ]
+		codes = [ ]
+		with open(path, 'rb') as f:
+			# Skip the file header
+			for n in range(3):
+				f.readline()
+			offset = f.tell()
+			rest = b''
+			while True:
+				block = f.read(_BLOCK_SIZE)
+				data = rest + block
+				# Scan the complete lines; the last one is carried over to the next block
+				linesEnd = data.rfind(b'\n') + 1 if block else len(data)
+				for match in _HEADER.finditer(data, 0, linesEnd):
+					start = match.start()
+					lineEnd = data.find(b'\n', start, linesEnd)
+					tokens = data[start:linesEnd if lineEnd == -1 else lineEnd].split(None, 5)
+					if len(tokens) != 6:
+						raise ValueError('{0} invalid. Airport header at byte {1} is incomplete.'.format(
+							path, offset + start))
+					starts.append(offset + start)
+					codes.append(tokens[4].decode('latin_1'))
+				if not block:
+					break
+				offset += linesEnd
+				rest = data[linesEnd:]
+			size = f.tell()
+
+		ranges = { }
+		for code, start, end in zip(codes, starts, starts[1:] + [size]):
+			ranges.setdefault(code, [ ]).append((start, end))
+		return cls(path, ranges, source)
+
+	## Loads the index from a file written by save(), or builds it and saves it if the file is
+	#  missing, of another version or out of date with apt.dat.
+	#  \param path Path to apt.dat.
+	#  \param indexPath Path to the index file.
+	@classmethod
+	def load(cls, path, indexPath):
+		try:
+			with open(indexPath, 'r') as f:
+				saved = json.load(f)
+			if saved['version'] == INDEX_VERSION and fingerprintMatches(path, saved['source']):
+				ranges = {code: [tuple(span) for span in spans]
+					for code, spans in saved['ranges'].items()}
+				return cls(path, ranges, saved['source'])
+		except (OSError, ValueError, KeyError, TypeError):
+			pass
+
+		print('Indexing {0}'.format(path), file = sys.stderr)
+		index = cls.build(path)
+		index.save(indexPath)
+		return index
+
+	## Writes the index to a file. The file is replaced atomically.
+	def save(self, indexPath):
+		temp = '{0}.tmp{1}'.format(indexPath, os.getpid())
+		with open(temp, 'w') as f:
+			json.dump(dict(version = INDEX_VERSION, source = self.source, ranges = self.ranges), f)
+		os.replace(temp, indexPath)
+
+	## Parses the airports with the given code.
+	#  \returns A list of airport navaid dicts as parsed from the whole file. Airports without any
+	#  runways or helipads are left out.
+	def parse(self, code):
+		airports = [ ]
+		for start, end in self.ranges.get(code, ()):
+			type, records, finished = parseChunk(self.path, start, end)
+			airports += records
+		return airports
+
+## Navaids mapping which parses airports from apt.dat only when their code is first looked up, and
+#  keeps them from then on. It otherwise behaves as the navaids dict of a NavData. Iterating over
+#  the navaids or their values parses every airport not yet looked up.
+class LazyNavaids(MutableMapping):
+	## Constructor.
+	#  \param navaids Dict of the navaids other than airports, code -> list of navaids.
+	#  \param index AirportIndex of apt.dat.
+	def __init__(self, navaids, index):
+		self._navaids = navaids
+		self._index = index
+		# Codes of the airports not parsed yet
+		self._pending = set(index.ranges)
+
+	def _load(self, code):
+		self._pending.discard(code)
+		airports = self._index.parse(code)
+		if len(airports) != 0:
+			self._navaids.setdefault(code, [ ]).extend(airports)
+
+	def __getitem__(self, code):
+		if code in self._pending:
+			self._load(code)
+		return self._navaids[code]
+
+	def __contains__(self, code):
+		if code in self._pending:
+			self._load(code)
+		return code in self._navaids
+
+	def __setitem__(self, code, navaids):
+		self._pending.discard(code)
+		self._navaids[code] = navaids
+
+	def __delitem__(self, code):
+		self._pending.discard(code)
+		del self._navaids[code]
+
+	def __iter__(self):
+		self.loadAll()
+		return iter(self._navaids)
+
+	def __len__(self):
+		self.loadAll()
+		return len(self._navaids)
+
+	## Returns the codes of all the navaids, including airports not parsed yet, without parsing them.
+	#  A few of these may turn out to have no navaids, for airports without runways or helipads.
+	def codes(self):
+		return self._pending | self._navaids.keys()
+
+	## Parses every airport not yet looked up.
+	def loadAll(self):
+		for code in list(self._pending):
+			self._load(code)
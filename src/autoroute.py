@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import heapq
+from math import *
+
+from geo import EARTH_RADIUS, coordsDistance
+from navdata import sameNavaid
+
+## Graph of the airway network. Each navaid on an airway is a node, and consecutive waypoints of an
+#  airway are joined by an edge in each direction carrying its great circle length.
+class AirwayGraph:
+	## Constructor; builds the graph.
+	#  \param airways Airways dict as stored in NavData.
+	def __init__(self, airways):
+		# Node -> airway navaid; (code, coords) -> node; code -> nodes
+		self.navaids = [ ]
+		self._nodes = { }
+		self._codes = { }
+		# Node -> list of (node, length, airway) edges
+		self.edges = [ ]
+		# Node -> unit vector, for the search heuristic
+		self._vectors = [ ]
+
+		for code, records in airways.items():
+			for airway in records:
+				previous = None
+				for waypoint in airway['waypoints']:
+					node = self._node(waypoint['navaid'])
+					if previous is not None:
+						length = coordsDistance(self.navaids[previous]['coords'],
+							self.navaids[node]['coords'])
+						self.edges[previous].append((node, length, airway))
+						self.edges[node].append((previous, length, airway))
+					previous = node
+
+	# Returns the node for an airway navaid, adding it if needed
+	def _node(self, navaid):
+		key = (navaid['code'], navaid['coords'])
+		if key not in self._nodes:
+			node = len(self.navaids)
+			self._nodes[key] = node
+			self._codes.setdefault(navaid['code'], [ ]).append(node)
+			self.navaids.append(navaid)
+			self.edges.append([ ])
+			lat, lon = radians(navaid['coords'][0]), radians(navaid['coords'][1])
+			self._vectors.append((cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat)))
+		return self._nodes[key]
+
+	## Returns the node of the given navaid, or \c None if it is not on any airway.
+	def find(self, navaid):
+		for node in self._codes.get(navaid['code'], ()):
+			if sameNavaid(self.navaids[node], navaid):
+				return node
+		return None
+
+	## Finds the shortest path along airways between two navaids with A*, using the great circle
+	#  distance to the destination as the heuristic.
+	#  \param src Source navaid.
+	#  \param dest Destination navaid.
+	#  \param high If not \c None, only high (\c True) or low (\c False) airways are used.
+	#  \param maxLeg If not \c None, legs longer than this many nautical miles are not used.
+	#  \returns A list of (node, airway) tuples for each node after the source, and the total
+	#  distance; or \c None and \c None if there is no path.
+	def search(self, src, dest, high = None, maxLeg = None):
+		start, goal = self.find(src), self.find(dest)
+		if start is None or goal is None:
+			return None, None
+		# The heuristic is the great circle distance to the goal, worked out from the chord between
+		# the unit vectors. It is scaled down slightly so that rounding can't make it overestimate.
+		gx, gy, gz = self._vectors[goal]
+		vectors = self._vectors
+		scale = 2 * EARTH_RADIUS * (1 - 1e-9)
+		def heuristic(node):
+			x, y, z = vectors[node]
+			return scale * asin(min(1.0, sqrt((x - gx) ** 2 + (y - gy) ** 2 + (z - gz) ** 2) / 2))
+
+		distances = {start: 0.0}
+		previous = { }
+		heap = [(heuristic(start), 0.0, start)]
+		while heap:
+			estimate, distance, node = heapq.heappop(heap)
+			if node == goal:
+				break
+			if distance > distances[node]:
+				# Stale entry
+				continue
+			for neighbour, length, airway in self.edges[node]:
+				if high is not None and airway['high'] != high:
+					continue
+				if maxLeg is not None and length > maxLeg:
+					continue
+				total = distance + length
+				if total < distances.get(neighbour, float('inf')):
+					distances[neighbour] = total
+					previous[neighbour] = (node, airway)
+					heapq.heappush(heap, (total + heuristic(neighbour), total, neighbour))
+		else:
+			return None, None
+
+		path = [ ]
+		node = goal
+		while node != start:
+			parent, airway = previous[node]
+			path.append((node, airway))
+			node = parent
+		path.reverse()
+		return path, distances[goal]
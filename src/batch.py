@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import multiprocessing
+
+from ifrroute import IfrRoute
+
+# Navdata used by the worker processes, set by the pool initializer. Forked workers inherit it
+# instead of having it pickled to them.
+_navdata = None
+
+## Parses many routes, optionally in parallel.
+#  \param navdata Navdata to use while parsing the routes.
+#  \param routes Iterable of route strings, or of (id, route string) tuples.
+#  \param workers Number of worker processes, or \c None to parse in this process.
+#  \param bestGuess Passed to IfrRoute.append().
+#  \param missingOk Passed to IfrRoute.append().
+#  \param chunksize Number of routes sent to a worker at a time.
+#  \param cruiseLevel Passed to IfrRoute.append().
+#  \returns A generator yielding an (id, waypoints, failure) tuple for each route, in input order.
+#  The id is the one given with the route or else its position in \p routes. On success the
+#  waypoints are as in IfrRoute.waypoints and the failure is \c None; otherwise the waypoints are
+#  \c None and the failure is the dict returned by IfrRoute.append().
+def parseRoutes(navdata, routes, workers = None, bestGuess = True, missingOk = False,
+	chunksize = 64, cruiseLevel = None):
+	items = (_item(n, route, bestGuess, missingOk, cruiseLevel) for n, route in enumerate(routes))
+	if not missingOk:
+		# Build the index of navaid codes used for the suggestions of failed routes now, rather than
+		# in each worker on its first failure
+		navdata.suggestNavaids('')
+
+	if workers is None or workers < 2:
+		for item in items:
+			yield _parse(navdata, item)
+		return
+
+	if 'fork' in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context('fork')
+	else:
+		# Without fork each worker gets its own copy of the navdata, once
+		context = multiprocessing.get_context()
+	pool = context.Pool(workers, _initWorker, (navdata, ))
+	try:
+		for key, waypoints, failure in pool.imap(_parseInWorker, items, chunksize):
+			if waypoints is not None:
+				_unpackWaypoints(navdata, waypoints)
+			yield key, waypoints, failure
+	finally:
+		pool.terminate()
+
+def _item(n, route, bestGuess, missingOk, cruiseLevel):
+	if isinstance(route, str):
+		return n, route, bestGuess, missingOk, cruiseLevel
+	return route[0], route[1], bestGuess, missingOk, cruiseLevel
+
+def _initWorker(navdata):
+	global _navdata
+	_navdata = navdata
+
+# Parses one route
+def _parse(navdata, item):
+	key, route, bestGuess, missingOk, cruiseLevel = item
+	ifrRoute = IfrRoute(navdata)
+	failure = ifrRoute.append(route, bestGuess, missingOk, cruiseLevel = cruiseLevel)
+	if failure is not None:
+		return key, None, failure
+	return key, ifrRoute.waypoints, None
+
+# Parses one route in a pool worker. The airways the waypoints refer to are replaced by references
+# so that whole airways aren't pickled back with every route.
+def _parseInWorker(item):
+	key, waypoints, failure = _parse(_navdata, item)
+	if failure is not None:
+		_packFailure(failure)
+	else:
+		_packWaypoints(_navdata, waypoints)
+	return key, waypoints, failure
+
+def _packWaypoints(navdata, waypoints):
+	for waypoint in waypoints:
+		# Navaids viewed from compact tables can't be pickled
+		if not isinstance(waypoint.navaid, dict):
+			waypoint.navaid = waypoint.navaid.copy()
+		for field in ('inAwy', 'outAwy'):
+			airway = waypoint[field]
+			if airway is not None:
+				airways = navdata.airways[airway['code']]
+				n = next(n for n, candidate in enumerate(airways) if candidate is airway)
+				waypoint[field] = (airway['code'], n)
+
+def _packFailure(failure):
+	for field in ('choices', 'suggestions'):
+		failure[field] = [navaid if isinstance(navaid, dict) else navaid.copy()
+			for navaid in failure[field]]
+
+def _unpackWaypoints(navdata, waypoints):
+	for waypoint in waypoints:
+		for field in ('inAwy', 'outAwy'):
+			if waypoint[field] is not None:
+				code, n = waypoint[field]
+				waypoint[field] = navdata.airways[code][n]
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Benchmarks of navdata loading, airway lookups and route parsing. The results are written as
+#  JSON so that they can be compared between versions. Without a navdata path a synthetic navdata
+#  set is generated with navgen.
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ifrroute import IfrRoute
+from navdata import *
+from navgen import generate
+from navparse import parseFiles
+from stats import Stats
+
+## Builds the segments of a single airway of the given length, shuffled and with random directions,
+#  as they would be read from awy.dat.
+def airwaySegments(count, seed = 0):
+	rand = random.Random(seed)
+	navaids = [dict(code = 'WP{0:03d}'.format(n % 1000), coords = (n * 0.01, n * 0.02))
+		for n in range(count + 1)]
+	segments = [ ]
+	for n in range(count):
+		ends = (navaids[n], navaids[n + 1])
+		if rand.random() < 0.5:
+			ends = ends[::-1]
+		segments.append(dict(waypoints = ends, high = True, base = 180, top = 450))
+	rand.shuffle(segments)
+	return segments
+
+## Times airway assembly for increasing segment counts. The time per segment should stay flat.
+def benchAirwayAssembly(counts = (1000, 2000, 4000, 8000, 16000, 32000)):
+	results = [ ]
+	for count in counts:
+		segments = airwaySegments(count)
+		start = time.perf_counter()
+		airways = assembleAirways('UL9', segments)
+		elapsed = time.perf_counter() - start
+		assert len(airways) == 1 and len(airways[0]['waypoints']) == count + 1
+		results.append((count, elapsed))
+	return results
+
+## Measures the memory held by the navaids and airways with tracemalloc, as parsed and once
+#  compacted.
+#  \param path Path to the navdata.
+#  \returns The bytes allocated for the parsed and compacted data.
+def benchMemory(path):
+	tracemalloc.start()
+	navdata = NavData(path)
+	# Only count the data itself, not the indexes
+	navdata._initIndexes()
+	gc.collect()
+	parsed = tracemalloc.get_traced_memory()[0]
+	navdata.compact()
+	gc.collect()
+	compact = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return parsed, compact
+
+## Measures the peak memory allocated while loading the navdata, with tracemalloc.
+def benchPeakMemory(path):
+	gc.collect()
+	tracemalloc.start()
+	NavData(path)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+## Times parsing each data file on its own, in this process, taking the best of a few runs.
+#  \returns A dict of file name -> dict of the seconds taken, the number of records and the rate
+#  in MB per second.
+def benchParse(path, runs = 3):
+	results = { }
+	for file in FILES:
+		filePath = os.path.join(path, file)
+		best = None
+		for n in range(runs):
+			start = time.perf_counter()
+			for parsed, type, records in parseFiles([filePath]):
+				pass
+			elapsed = time.perf_counter() - start
+			best = elapsed if best is None else min(best, elapsed)
+			count = len(records)
+			del records
+		results[file] = dict(seconds = best, records = count,
+			mbPerSecond = os.path.getsize(filePath) / (1 << 20) / best)
+	return results
+
+## Times loading the navdata: the load phases recorded in the stats (parsing each file, storing
+#  the navaids and assembling the airways), the whole of NavData(), and opening the binary cache.
+#  \returns A dict of times in seconds.
+def benchLoad(path):
+	stats = Stats()
+	start = time.perf_counter()
+	navdata = NavData(path, stats = stats)
+	elapsed = time.perf_counter() - start
+	results = dict((name.split('.', 1)[1], total)
+		for name, (count, total) in stats.timers.items() if name.startswith('load.'))
+	results['navdata'] = elapsed
+
+	with tempfile.TemporaryDirectory() as directory:
+		cachePath = os.path.join(directory, 'navdata.cache')
+		navdata.saveCache(cachePath)
+		start = time.perf_counter()
+		NavData.open(cachePath)
+		results['openCache'] = time.perf_counter() - start
+	return results
+
+## Picks routes along the airways of a navdata: a navaid, an airway, a navaid further along it and
+#  sometimes a direct leg to another navaid.
+#  \returns A list of route strings.
+def sampleRoutes(navdata, count, seed = 0):
+	rand = random.Random(seed)
+	codes = sorted(navdata.airways)
+	navaids = sorted(navdata.navaids)
+	routes = [ ]
+	while len(routes) < count:
+		code = rand.choice(codes)
+		waypoints = rand.choice(navdata.airways[code])['waypoints']
+		start, end = sorted(rand.sample(range(len(waypoints)), 2))
+		route = [waypoints[start]['navaid']['code'], code, waypoints[end]['navaid']['code']]
+		if rand.random() < 0.3:
+			route += ['DCT', rand.choice(navaids)]
+		routes.append(' '.join(route))
+	return routes
+
+## Times findAirway() over the airway legs of the given routes.
+#  \returns A dict with the number of calls and the mean time per call in microseconds.
+def benchFindAirway(navdata, routes):
+	lookups = [ ]
+	for route in routes:
+		src, airway, dest = route.split()[:3]
+		lookups.append((airway, navdata.navaids[src][0], dest))
+	start = time.perf_counter()
+	for airway, src, dest in lookups:
+		navdata.findAirway(airway, src, dest)
+	elapsed = time.perf_counter() - start
+	return dict(calls = len(lookups), meanUs = elapsed * 1e6 / len(lookups))
+
+## Times parsing the given routes with IfrRoute.append(). In best guess mode each route is parsed
+#  in one call; in attended mode each choice between navaids is answered with the first choice.
+#  \returns A dict with the number of routes, the choices answered, the failures, and the mean
+#  time per route in microseconds.
+def benchAppend(navdata, routes, bestGuess):
+	choices, failures = 0, 0
+	start = time.perf_counter()
+	for route in routes:
+		ifrRoute = IfrRoute(navdata)
+		if bestGuess:
+			failure = ifrRoute.append(route, True)
+		else:
+			session = ifrRoute.session(route)
+			failure = session.failure
+			while failure is not None and len(failure['choices']) != 0:
+				choices += 1
+				failure = session.choose(failure['choices'][0])
+		if failure is not None:
+			failures += 1
+	elapsed = time.perf_counter() - start
+	return dict(routes = len(routes), choices = choices, failures = failures,
+		meanUs = elapsed * 1e6 / len(routes))
+
+## Runs every benchmark against a navdata.
+#  \param path Path to the navdata.
+#  \param routes Number of routes to parse.
+#  \returns The results as a dict.
+def benchAll(path, routes = 1000):
+	results = dict(python = sys.version.split()[0])
+	print('Parsing', file = sys.stderr)
+	results['parse'] = benchParse(path)
+	print('Loading', file = sys.stderr)
+	results['load'] = benchLoad(path)
+	navdata = NavData(path)
+	results['navaids'] = sum(len(navaids) for navaids in navdata.navaids.values())
+	results['airways'] = sum(len(airways) for airways in navdata.airways.values())
+
+	print('Parsing routes', file = sys.stderr)
+	sample = sampleRoutes(navdata, routes)
+	results['findAirway'] = benchFindAirway(navdata, sample)
+	results['append'] = dict(bestGuess = benchAppend(navdata, sample, True),
+		attended = benchAppend(navdata, sample, False))
+	# Once more with the stats, to see where the time goes
+	stats = navdata.enableStats()
+	benchAppend(navdata, sample, True)
+	results['append']['stats'] = stats.report()
+	navdata.disableStats()
+
+	print('Airway assembly', file = sys.stderr)
+	results['assembly'] = [dict(segments = count, seconds = elapsed)
+		for count, elapsed in benchAirwayAssembly()]
+
+	print('Memory', file = sys.stderr)
+	parsed, compact = benchMemory(path)
+	results['memory'] = dict(peak = benchPeakMemory(path), parsed = parsed, compact = compact)
+	return results
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Benchmarks the navdata and route parsing.')
+	parser.add_argument('path', nargs = '?',
+		help = 'path to the navdata; a synthetic set is generated if not given')
+	parser.add_argument('--routes', type = int, default = 1000, help = 'number of routes to parse')
+	parser.add_argument('--fixes', type = int, default = 20000,
+		help = 'number of fixes in the synthetic set')
+	parser.add_argument('--seed', type = int, default = 0, help = 'seed of the synthetic set')
+	args = parser.parse_args()
+
+	if args.path is not None:
+		results = benchAll(args.path, args.routes)
+	else:
+		with tempfile.TemporaryDirectory() as path:
+			print('Generating navdata', file = sys.stderr)
+			generate(path, fixes = args.fixes, seed = args.seed)
+			results = benchAll(path, args.routes)
+			results['synthetic'] = dict(fixes = args.fixes, seed = args.seed)
+	json.dump(results, sys.stdout, indent = 2, sort_keys = True)
+	print()
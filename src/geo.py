@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from itertools import chain
+from math import *
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+## Mean radius of the earth in nautical miles.
+EARTH_RADIUS = 3441.035
+
+## Calculates the great circle distance between two points.
+#  \param standpoint Standpoint tuple (lat, lon)
+#  \param forepoint Forepoint tuple (lat, lon)
+def coordsDistance(standpoint, forepoint):
+	s = (radians(standpoint[0]), radians(standpoint[1]))
+	f = (radians(forepoint[0]),  radians(forepoint[1]))
+	lonDiff = f[1] - s[1]
+	return EARTH_RADIUS * atan2(sqrt(pow(cos(f[0]) * sin(lonDiff), 2) + pow(cos(s[0]) * sin(f[0]) - sin(s[0]) * cos(f[0]) * cos(lonDiff), 2)),
+		sin(s[0]) * sin(f[0]) + cos(s[0]) * cos(f[0]) * cos(lonDiff))
+
+## Converts a sequence of (lat, lon) tuples in degrees to radians, in the form accepted by
+#  coordsDistanceMany(). This is an N x 2 array if NumPy is available, otherwise a list of tuples.
+def coordsRadians(coords):
+	if numpy is not None:
+		return numpy.radians(numpy.array(coords, dtype = float).reshape(-1, 2))
+	return [(radians(point[0]), radians(point[1])) for point in coords]
+
+## Calculates the great circle distances from one point to many. Gives the same results as
+#  coordsDistance() for each point.
+#  \param standpoint Standpoint tuple (lat, lon) in degrees.
+#  \param forepoints Sequence of forepoint tuples (lat, lon), or an N x 2 array.
+#  \param inRadians Set to \c True if \p forepoints is already in radians, e.g. from
+#  coordsRadians().
+#  \returns The distances, as an array if NumPy is available, otherwise as a list.
+def coordsDistanceMany(standpoint, forepoints, inRadians = False):
+	s = (radians(standpoint[0]), radians(standpoint[1]))
+	sinS, cosS = sin(s[0]), cos(s[0])
+
+	if numpy is None:
+		if not inRadians:
+			forepoints = coordsRadians(forepoints)
+		distances = [ ]
+		for f in forepoints:
+			lonDiff = f[1] - s[1]
+			distances.append(EARTH_RADIUS * atan2(sqrt(pow(cos(f[0]) * sin(lonDiff), 2) + pow(cosS * sin(f[0]) - sinS * cos(f[0]) * cos(lonDiff), 2)),
+				sinS * sin(f[0]) + cosS * cos(f[0]) * cos(lonDiff)))
+		return distances
+
+	f = numpy.asarray(forepoints, dtype = float).reshape(-1, 2)
+	if not inRadians:
+		f = numpy.radians(f)
+	sinF, cosF = numpy.sin(f[:, 0]), numpy.cos(f[:, 0])
+	lonDiff = f[:, 1] - s[1]
+	cosDiff = numpy.cos(lonDiff)
+	return EARTH_RADIUS * numpy.arctan2(
+		numpy.hypot(cosF * numpy.sin(lonDiff), cosS * sinF - sinS * cosF * cosDiff),
+		sinS * sinF + cosS * cosF * cosDiff)
+
+## Calculates the great circle distances between consecutive points.
+#  \param coords Sequence of (lat, lon) tuples in degrees.
+#  \returns A list of the N - 1 distances. They are worked out with NumPy if it is available.
+def pathDistances(coords):
+	if numpy is None or len(coords) < 2:
+		return [coordsDistance(coords[n], coords[n + 1]) for n in range(len(coords) - 1)]
+
+	points = numpy.fromiter(chain.from_iterable(coords), dtype = float, count = 2 * len(coords))
+	points = numpy.radians(points.reshape(-1, 2))
+	s, f = points[:-1], points[1:]
+	sinS, cosS = numpy.sin(s[:, 0]), numpy.cos(s[:, 0])
+	sinF, cosF = numpy.sin(f[:, 0]), numpy.cos(f[:, 0])
+	lonDiff = f[:, 1] - s[:, 1]
+	cosDiff = numpy.cos(lonDiff)
+	return (EARTH_RADIUS * numpy.arctan2(
+		numpy.hypot(cosF * numpy.sin(lonDiff), cosS * sinF - sinS * cosF * cosDiff),
+		sinS * sinF + cosS * cosF * cosDiff)).tolist()
+
+## Calculates the point a given fraction of the way along the great circle between two points.
+#  \param standpoint Standpoint tuple (lat, lon)
+#  \param forepoint Forepoint tuple (lat, lon)
+#  \param fraction Fraction of the distance from the standpoint, from 0 to 1.
+#  \returns The point as a (lat, lon) tuple.
+def coordsBetween(standpoint, forepoint, fraction):
+	distance = coordsDistance(standpoint, forepoint) / EARTH_RADIUS
+	if distance == 0:
+		return tuple(standpoint)
+	s = (radians(standpoint[0]), radians(standpoint[1]))
+	f = (radians(forepoint[0]),  radians(forepoint[1]))
+	a = sin((1 - fraction) * distance) / sin(distance)
+	b = sin(fraction * distance) / sin(distance)
+	x = a * cos(s[0]) * cos(s[1]) + b * cos(f[0]) * cos(f[1])
+	y = a * cos(s[0]) * sin(s[1]) + b * cos(f[0]) * sin(f[1])
+	z = a * sin(s[0]) + b * sin(f[0])
+	return (degrees(atan2(z, hypot(x, y))), degrees(atan2(y, x)))
+
+## Returns the indexes that sort the given distances, nearest first. Equal distances keep their
+#  original order.
+def argsortDistances(distances):
+	if numpy is not None and isinstance(distances, numpy.ndarray):
+		return numpy.argsort(distances, kind = 'stable').tolist()
+	return sorted(range(len(distances)), key = distances.__getitem__)
+
+## Returns the indexes of the distances that are no greater than the given limit.
+def indexesWithin(distances, limit):
+	if numpy is not None and isinstance(distances, numpy.ndarray):
+		return numpy.flatnonzero(distances <= limit).tolist()
+	return [n for n, distance in enumerate(distances) if distance <= limit]
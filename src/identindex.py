@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import gc
+from bisect import bisect_left
+from itertools import combinations
+
+## Index of navaid idents for suggesting the idents a mistyped or unknown ident might have been
+#  meant as, without scanning them all.
+#
+#  Prefix matches are found by bisecting the sorted idents. Near matches are found through the
+#  deletion neighbourhood of each ident: the strings left by deleting up to maxEdits of its
+#  characters. Two idents within that many edits (characters changed, added or removed, or two
+#  neighbours swapped) can each be turned into the same string by deleting at most that many
+#  characters, so looking up the deletion neighbourhood of the query finds all of them.
+#
+#  Deleting two characters of a short ident leaves one or two characters, shared by thousands of
+#  idents, so two edits are only indexed and looked up for idents of at least TWO_EDIT_LENGTH
+#  characters. Idents two edits apart are then matched if the longer of them is at least that long:
+#  the shorter needs fewer deletions the more their lengths differ. Even so, among a few hundred
+#  thousand idents of five characters hundreds are two edits from any other, so only so many of
+#  those found through two deletions are checked.
+class IdentIndex:
+	## Shortest ident whose two edit neighbourhood is indexed.
+	TWO_EDIT_LENGTH = 5
+	## Greatest number of idents found only through two deletions that similar() checks.
+	TWO_EDIT_CANDIDATES = 50
+
+	## Constructor.
+	#  \param idents Iterable of idents.
+	#  \param maxEdits Greatest number of edits similar() can be asked for, 1 or 2. The index of two
+	#  edits is several times larger.
+	def __init__(self, idents, maxEdits = 2):
+		self._idents = sorted(set(idents))
+		self._known = set(self._idents)
+		self.maxEdits = maxEdits
+		# For each number of characters deleted, ident with them deleted -> idents it comes from.
+		# They are kept apart so that a search for one edit doesn't go through the idents sharing
+		# two deletions. Lists of one ident are stored as the ident itself, which saves most of the
+		# memory.
+		self._deletions = [{ } for depth in range(maxEdits)]
+		# Collection can't free anything while the index is built, but would run over and over
+		collecting = gc.isenabled()
+		gc.disable()
+		try:
+			for ident in self._idents:
+				for deletions, keys in zip(self._deletions,
+					_deletions(ident, self._depth(ident, maxEdits))):
+					for key in keys:
+						found = deletions.get(key)
+						if found is None:
+							deletions[key] = ident
+						elif found.__class__ is str:
+							deletions[key] = [found, ident]
+						else:
+							found.append(ident)
+		finally:
+			if collecting:
+				gc.enable()
+
+	## Returns the idents starting with the given prefix, in order.
+	#  \param prefix Prefix; the ident equal to it is included if there is one.
+	#  \param limit Maximum number of idents to return.
+	def prefixed(self, prefix, limit = 50):
+		idents = [ ]
+		for n in range(bisect_left(self._idents, prefix), len(self._idents)):
+			if len(idents) == limit or not self._idents[n].startswith(prefix):
+				break
+			idents.append(self._idents[n])
+		return idents
+
+	## Returns the idents near the given one.
+	#  \param ident Ident to match. It is not included in the results.
+	#  \param maxEdits Greatest number of edits, 1 or 2. It can't be more than the index was built
+	#  for. Idents two edits away are only returned if it or the ident is at least TWO_EDIT_LENGTH
+	#  characters long, and not all of them are returned if there are many.
+	#  \returns A list of (edits, ident) tuples, fewest edits first, then in order of ident.
+	def similar(self, ident, maxEdits = 2):
+		if maxEdits > self.maxEdits:
+			raise ValueError('Index only built for {0} edits'.format(self.maxEdits))
+
+		# Every ident sharing a string with at most one character deleted from each is checked. Of
+		# those sharing one only with two deleted from either, at most TWO_EDIT_CANDIDATES are, taken
+		# in the same order each time.
+		keys = [{ident}] + _deletions(ident, self._depth(ident, maxEdits))
+		near = [(key, deleted) for level in keys[:2] for key in level for deleted in (0, 1)]
+		far = [ ]
+		if maxEdits == 2:
+			far = [(key, 2) for key in sorted(set().union(*keys[:2]))]
+			if len(keys) > 2:
+				far += [(key, deleted) for key in sorted(keys[2]) for deleted in (0, 1, 2)]
+
+		candidates = set()
+		for key, deleted in near:
+			found = self._lookup(key, deleted)
+			if found.__class__ is str:
+				candidates.add(found)
+			elif found is not None:
+				candidates.update(found)
+		limit = len(candidates) + self.TWO_EDIT_CANDIDATES
+		for key, deleted in far:
+			if len(candidates) >= limit:
+				break
+			found = self._lookup(key, deleted)
+			if found.__class__ is str:
+				candidates.add(found)
+			elif found is not None:
+				candidates.update(found[:limit - len(candidates)])
+		candidates.discard(ident)
+
+		results = [ ]
+		for candidate in candidates:
+			edits = _fewEdits(ident, candidate)
+			# Short idents sharing a deletion can be two edits apart without being indexed as such
+			if edits <= 1 or (edits <= maxEdits and
+				max(len(ident), len(candidate)) >= self.TWO_EDIT_LENGTH):
+				results.append((edits, candidate))
+		results.sort()
+		return results
+
+	# Returns the idents which give the key with the given number of characters deleted: None, an
+	# ident or a list of them
+	def _lookup(self, key, deleted):
+		if deleted == 0:
+			return key if key in self._known else None
+		return self._deletions[deleted - 1].get(key)
+
+	# Returns the number of characters deleted from an ident in its neighbourhood
+	def _depth(self, ident, maxEdits):
+		return maxEdits if len(ident) >= self.TWO_EDIT_LENGTH else min(maxEdits, 1)
+
+# Returns the strings left by deleting characters of a string, as a list of sets: those with one
+# character deleted, with two, and so on to the given number
+def _deletions(string, depth):
+	return [set(map(''.join, combinations(string, len(string) - n)))
+		for n in range(1, min(depth, len(string)) + 1)]
+
+## Returns the number of edits between two strings, counting changed, added and removed characters
+#  and swaps of neighbouring characters.
+#  \param limit If given, the counting stops once it exceeds this, and limit + 1 is returned.
+def editDistance(a, b, limit = None):
+	if len(a) > len(b):
+		a, b = b, a
+	if limit is not None and len(b) - len(a) > limit:
+		return limit + 1
+	if limit is not None and limit <= 2:
+		return min(_fewEdits(a, b), limit + 1)
+	# Quick answers for strings one edit apart
+	if len(a) == len(b):
+		differences = [n for n in range(len(a)) if a[n] != b[n]]
+		if len(differences) <= 1:
+			return len(differences)
+		if len(differences) == 2 and differences[1] == differences[0] + 1 and \
+			a[differences[0]] == b[differences[1]] and a[differences[1]] == b[differences[0]]:
+			return 1
+	elif len(b) == len(a) + 1:
+		n = 0
+		while n < len(a) and a[n] == b[n]:
+			n += 1
+		if a[n:] == b[n + 1:]:
+			return 1
+
+	previous2, previous = None, list(range(len(b) + 1))
+	for i in range(1, len(a) + 1):
+		row = [i]
+		best = i
+		for j in range(1, len(b) + 1):
+			edits = previous[j - 1] if a[i - 1] == b[j - 1] else previous[j - 1] + 1
+			if previous[j] + 1 < edits:
+				edits = previous[j] + 1
+			if row[j - 1] + 1 < edits:
+				edits = row[j - 1] + 1
+			if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and \
+				previous2[j - 2] + 1 < edits:
+				edits = previous2[j - 2] + 1
+			row.append(edits)
+			if edits < best:
+				best = edits
+		if limit is not None and best > limit:
+			return limit + 1
+		previous2, previous = previous, row
+	if limit is not None and previous[-1] > limit:
+		return limit + 1
+	return previous[-1]
+
+# Returns the number of edits between two strings if it is at most two, otherwise 3. Once the common
+# start and end are dropped, the strings differ at both ends, so the edits must cover both ends and
+# the few ways that can be done are checked directly.
+def _fewEdits(a, b):
+	n, length = 0, min(len(a), len(b))
+	while n < length and a[n] == b[n]:
+		n += 1
+	if n != 0:
+		a, b = a[n:], b[n:]
+	while a and b and a[-1] == b[-1]:
+		a, b = a[:-1], b[:-1]
+	if len(a) > len(b):
+		a, b = b, a
+	extra = len(b) - len(a)
+	if len(a) == 0:
+		return min(extra, 3)
+
+	if extra == 0:
+		if len(a) == 1 or (len(a) == 2 and a[0] == b[1] and a[1] == b[0]):
+			return 1
+		# Both ends changed; one end swapped and the other changed; both ends swapped; or a
+		# character removed from one end and added at the other
+		swappedStart = a[0] == b[1] and a[1] == b[0]
+		swappedEnd = a[-1] == b[-2] and a[-2] == b[-1]
+		if a[1:-1] == b[1:-1] or (swappedStart and a[2:-1] == b[2:-1]) or \
+			(swappedEnd and a[1:-2] == b[1:-2]) or (swappedStart and swappedEnd and a[2:-2] == b[2:-2]) or \
+			a[1:] == b[:-1] or a[:-1] == b[1:]:
+			return 2
+	elif extra == 1:
+		# A character added at one end and the other end changed or swapped
+		if a[:-1] == b[1:-1] or a[1:] == b[1:-1] or (len(a) > 1 and
+			((a[-1] == b[-2] and a[-2] == b[-1] and a[:-2] == b[1:-2]) or
+			(a[0] == b[1] and a[1] == b[0] and a[2:] == b[2:-1]))):
+			return 2
+	elif extra == 2 and a == b[1:-1]:
+		return 2
+	return 3
@@ -1,61 +1,93 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from math import *
-
-## Calculates the great circle distance between two points.
-#  \param standpoint Standpoint tuple (lat, lon)
-#  \param forepoint Forepoint tuple (lat, lon)
-def coordsDistance(standpoint, forepoint):
-	s = (radians(standpoint[0]), radians(standpoint[1]))
-	f = (radians(forepoint[0]),  radians(forepoint[1]))
-	lonDiff = f[1] - s[1]
-	return 3441.035 * atan2(sqrt(pow(cos(f[0]) * sin(lonDiff), 2) + pow(cos(s[0]) * sin(f[0]) - sin(s[0]) * cos(f[0]) * cos(lonDiff), 2)),
-		sin(s[1]) * sin(f[1]) + cos(s[1]) * cos(s[1]) * cos(lonDiff))
+import time
 
-class IfrRoute:
-	## Constructor; creates a route from the given route string.
-	#  \param navdata Navdata to use while parsing the route.
-	#  \param route Route to parse. This constructor will make a best guess at the route if any of
-	#  the requested waypoints or airways are missing, or if there are multiple choices. If you need
-	#  to be alerted in these cases, leave this as None and use the append() function instead.
-	def __init__(self, navdata, route = None):
-		self._navdata = navdata
-		self.waypoints = [ ]
-		if route is not None:
-			self.append(route, True, False)
+from geo import coordsBetween, coordsDistance, coordsDistanceMany, numpy
+from leg import Leg
+from navdata import sameNavaid
 
-	## Appends the given route to the current route.
-	#  \param route Route to append.
-	#  \param bestGuess If set to \c True, when there are multiple potential navaids, the closest
-	#  will be used. If there are multiple potential ariways, the first will be used. If this is set
-	#  to \c False and this happens, the function will return a RouteFailure object.
-	#  \param missingOk If False, when a navaid or airway in the route is not found, a
-	#  RouteFailure will be returned, otherwise it will be ignored.
-	#  \param choice If not None, this identifies which waypoint to use in case of multiple choices.
-	def append(self, route, bestGuess = False, missingOk = False, choice = None):
-		lastWaypoint = None
-		tokens = route.upper().split()
-		remaining = ' '.join(tokens)
+def _copyWaypoints(waypoints):
+	return [waypoint.copy() for waypoint in waypoints]
+
+def _copyFailure(failure):
+	if failure is None:
+		return None
+	failure = failure.copy()
+	failure['choices'] = list(failure['choices'])
+	failure['suggestions'] = list(failure['suggestions'])
+	return failure
+
+## Parse of a route being appended to an IfrRoute, which can be resumed where it stopped. When a
+#  code matches more than one navaid and a guess isn't wanted, parsing stops with a failure listing
+#  the choices; choose() then carries on from that token with the cursor, the last waypoint and the
+#  expected token types as they were. Create one with IfrRoute.session().
+class ParseSession:
+	def __init__(self, route, routeString, bestGuess, missingOk, cruiseLevel = None):
+		self._route = route
+		self._navdata = route._navdata
+		stats = self._navdata.stats
+		if stats is not None:
+			start = time.perf_counter()
+		self._tokens = routeString.upper().split()
+		if stats is not None:
+			stats.time('route.tokenize', time.perf_counter() - start)
+		self._bestGuess = bestGuess
+		self._missingOk = missingOk
+		self._cruiseLevel = cruiseLevel
+		# Index of the current token, and the last waypoint appended
+		self._i = 0
+		self._lastWaypoint = None
 		# Type of token we are expecting the next to be
-		expecting = dict(waypoint = True, airway = False, direct = False)
+		self._expecting = dict(waypoint = True, airway = False, direct = False)
+		## Failure dict as returned by IfrRoute.append() if parsing stopped, otherwise \c None.
+		self.failure = None
+
+	## Returns \c True if the whole route has been parsed.
+	def done(self):
+		return self.failure is None
+
+	## Continues parsing using the given navaid for the waypoint parsing stopped at.
+	#  \param candidate One of the choices in the failure.
+	#  \returns \c None if the rest of the route was parsed, otherwise a failure dict as before.
+	def choose(self, candidate):
+		if self.failure is None or len(self.failure['choices']) == 0:
+			raise ValueError('the session is not waiting for a choice')
+		first = len(self._route.waypoints)
+		failure = self._resume(candidate)
+		self._route._measure(first)
+		return failure
+
+	# Parses tokens from the current one on, using the given choice for the current token if it is
+	# not None
+	def _resume(self, choice):
+		self.failure = None
+		tokens = self._tokens
+		expecting = self._expecting
+		stats = self._navdata.stats
+		lastWaypoint = self._lastWaypoint
+		bestGuess = self._bestGuess
+		missingOk = self._missingOk
+		cruiseLevel = self._cruiseLevel
+		i = self._i
 
 		# Parse each token
-		i = 0
 		while i != len(tokens):
 			if expecting['direct'] and i != len(tokens) - 1:
 				if tokens[i] == 'DCT' or tokens[i] == 'SID' or tokens[i] == 'STAR':
 					expecting['waypoint'] = True
 					expecting['airway'] = False
 					expecting['direct'] = False
+					i += 1
 					continue
 
 			if expecting['airway']:
 				# Make sure this isn't the first or last token
 				if lastWaypoint is not None and i != len(tokens) - 1:
-					found, lastWaypoint = self._findAirway(tokens[i], lastWaypoint, tokens[i + 1])
-					if found:
-						i += 2
+					used, lastWaypoint = self._route._followAirway(tokens[i], lastWaypoint,
+						tokens[i + 1], cruiseLevel)
+					if used != 0:
+						i += used
 						if i == len(tokens):
 							break
 						expecting['waypoint'] = True
@@ -65,91 +97,444 @@ class IfrRoute:
 
 			if expecting['waypoint']:
 				if choice is not None:
-					self.waypoints.append(choice.update(inAwy = None, outAwy = None))
+					self._route.waypoints.append(Leg(choice))
 					lastWaypoint = choice
 					choice = None
 				else:
 					if tokens[i] not in self._navdata.navaids:
 						# No waypoints found
 						if not missingOk:
-							# Could it be an airway as well?
-							navaid, wp1, wp2 = True, None, None
-							if expecting['airway'] and lastWaypoint is not None and \
-								i != len(tokens) - 1:
-								navaid, wp1, wp2 = False, tokens[i - 1], tokens[i + 1]
-							return dict(remaining = remaining, navaid = navaid, code = tokens[i],
-								choices = [ ], wp1 = wp1, wp2 = wp2)
+							self._i, self._lastWaypoint = i, lastWaypoint
+							return self._fail(lastWaypoint, [ ])
 					else:
+						if stats is not None:
+							start = time.perf_counter()
 						navaids = self._navdata.navaids[tokens[i]]
 						if bestGuess:
 							# Sort navaids by distance
 							standpoint = (0, 0)
 							if lastWaypoint is not None:
 								standpoint = lastWaypoint['coords']
-							navaids = sorted(navaids, key = lambda navaid:
-								coordsDistance(standpoint, navaid['coords']))
+							navaids = self._navdata.nearestNavaids(tokens[i], standpoint)
+						if stats is not None:
+							stats.time('route.candidates', time.perf_counter() - start)
+							stats.count('candidates', len(navaids))
+
+						if bestGuess:
+							waypoints = self._route.waypoints
 
 							if len(navaids) == 1 or i >= len(tokens) - 2:
 								# Only one waypoint found, or no possibility of following airway
-								waypoint = navaids[0].copy()
-								waypoint.update(inAwy = None, outAwy = None)
-								self.waypoints.append(waypoint)
+								waypoints.append(Leg(navaids[0]))
 								# Check for airway
 								if i < len(tokens) - 2:
-									found, lastWaypoint = self._findAirway(tokens[i + 1],
-										navaids[0], tokens[i + 2])
-									if found:
-										i += 2
+									used, lastWaypoint = self._route._followAirway(tokens[i + 1],
+										navaids[0], tokens[i + 2], cruiseLevel)
+									i += used
 							elif i < len(tokens) - 2:
 								# More than one waypoint found with possibility of following airway
-								self.waypoints.append(None)
-								found = False
+								waypoints.append(None)
+								used = 0
 								for navaid in navaids:
-									waypoint = navaid.copy()
-									waypoint.update(inAwy = None, outAwy = None)
-									self.waypoints[-1] = waypoint
-									found, lastWaypoint = self._findAirway(tokens[i + 1],
-										navaid, tokens[i + 2])
-									if found:
-										i += 2
+									waypoints[-1] = Leg(navaid)
+									used, lastWaypoint = self._route._followAirway(tokens[i + 1],
+										navaid, tokens[i + 2], cruiseLevel)
+									if used != 0:
+										i += used
 										break
-								if not found:
+								if used == 0:
 									# Couldn't find any suitable adjoining airway; just use the
 									# nearest navaid
-									waypoint = navaids[0]
-									waypoint.copy().update(inAwy = None, outAwy = None)
-									self.waypoints[-1] = waypoint
+									waypoints[-1] = Leg(navaids[0])
 									lastWaypoint = navaids[0]
 						else:
 							if len(navaids) == 1:
-								waypoint = navaids[0].copy()
-								waypoint.update(inAwy = None, outAwy = None)
-								self.waypoints.append(waypoint)
+								self._route.waypoints.append(Leg(navaids[0]))
 								lastWaypoint = navaids[0]
 							elif len(navaids) > 1:
-								# Could it be an airway as well?
-								navaid, wp1, wp2 = True, None, None
-								if expecting['airway'] and lastWaypoint is not None and \
-									i != len(tokens) - 1:
-									navaid, wp1, wp2 = False, tokens[i - 1], tokens[i + 1]
-								return dict(remaining = remaining, navaid = navaid,
-									code = tokens[i], choices = navaids, wp1 = wp1, wp2 = wp2)
+								self._i, self._lastWaypoint = i, lastWaypoint
+								return self._fail(lastWaypoint, navaids)
 
 				expecting['direct'] = True
 				expecting['airway'] = True
 
 			i += 1
-			remaining = ' '.join(tokens[i:])
 
+		self._i, self._lastWaypoint = i, lastWaypoint
 		return None
 
+	# Stops parsing at the current token, recording the failure. Only here is the rest of the route
+	# joined back into a string.
+	def _fail(self, lastWaypoint, choices):
+		tokens, i = self._tokens, self._i
+		# Could it be an airway as well?
+		navaid, wp1, wp2 = True, None, None
+		if self._expecting['airway'] and lastWaypoint is not None and i != len(tokens) - 1:
+			navaid, wp1, wp2 = False, tokens[i - 1], tokens[i + 1]
+		suggestions = [ ]
+		if len(choices) == 0:
+			suggestions = self._navdata.suggestNavaids(tokens[i],
+				None if lastWaypoint is None else lastWaypoint['coords'])
+		self.failure = dict(remaining = ' '.join(tokens[i:]), navaid = navaid, code = tokens[i],
+			choices = choices, suggestions = suggestions, wp1 = wp1, wp2 = wp2)
+		return self.failure
+
+class IfrRoute:
+	## Constructor; creates a route from the given route string.
+	#  \param navdata Navdata to use while parsing the route.
+	#  \param route Route to parse. This constructor will make a best guess at the route if any of
+	#  the requested waypoints or airways are missing, or if there are multiple choices. If you need
+	#  to be alerted in these cases, leave this as None and use the append() function instead.
+	def __init__(self, navdata, route = None):
+		self._navdata = navdata
+		# Leg for each waypoint
+		self.waypoints = [ ]
+		if route is not None:
+			self.append(route, True, False)
+
+	## Creates a route between two navaids along airways, choosing the shortest path through the
+	#  airway network.
+	#  \param navdata Navdata to use.
+	#  \param src Source navaid. This must be on an airway.
+	#  \param dest Destination navaid. This must be on an airway.
+	#  \param high If not \c None, only high (\c True) or low (\c False) airways are used.
+	#  \param maxLeg If not \c None, legs longer than this many nautical miles are not used.
+	#  \returns The route, or \c None if there is no route. The waypoints carry the same inAwy and
+	#  outAwy annotations as those of a parsed route.
+	@classmethod
+	def autoroute(cls, navdata, src, dest, high = None, maxLeg = None):
+		graph = navdata.airwayGraph()
+		path, distance = graph.search(src, dest, high, maxLeg)
+		if path is None:
+			return None
+
+		route = cls(navdata)
+		route.waypoints.append(Leg(src))
+		for node, airway in path:
+			route.waypoints[-1].outAwy = airway
+			route.waypoints.append(Leg(graph.navaids[node], airway))
+		route._measure(0)
+		return route
+
+	## Appends the given route to the current route.
+	#  \param route Route to append.
+	#  \param bestGuess If set to \c True, when there are multiple potential navaids, the closest
+	#  will be used. If there are multiple potential ariways, the first will be used. If this is set
+	#  to \c False and this happens, the function will return a RouteFailure object.
+	#  \param missingOk If False, when a navaid or airway in the route is not found, a
+	#  RouteFailure will be returned, otherwise it will be ignored. When a navaid is not found, the
+	#  failure's suggestions list navaids with similar codes, nearest the last waypoint first; see
+	#  NavData.suggestNavaids().
+	#  \param choice If not None, this identifies which waypoint to use in case of multiple choices.
+	#  To carry on from a failure without parsing the remaining route again, use session().
+	#  \param cruiseLevel If not None, airways are only followed where they are open at this flight
+	#  level (in hundreds of feet, e.g. 350); see NavData.findAirway().
+	def append(self, route, bestGuess = False, missingOk = False, choice = None, cruiseLevel = None):
+		stats = self._navdata.stats
+		if stats is not None:
+			start = time.perf_counter()
+		first = len(self.waypoints)
+		if choice is not None:
+			failure = self._append(route, bestGuess, missingOk, choice, cruiseLevel)
+		else:
+			failure = self._cached(('append', route, bestGuess, missingOk, cruiseLevel),
+				lambda: self._append(route, bestGuess, missingOk, None, cruiseLevel))
+		self._measure(first)
+		if stats is not None:
+			stats.time('route.append', time.perf_counter() - start)
+		return failure
+
+	def _append(self, route, bestGuess, missingOk, choice, cruiseLevel):
+		return ParseSession(self, route, bestGuess, missingOk, cruiseLevel)._resume(choice)
+
+	## Starts parsing a route to append to the current route, as append() does, but in a session
+	#  that can be resumed where it stopped. This avoids re-parsing the rest of the route each time a
+	#  choice between navaids has to be made.
+	#  \param route Route to append.
+	#  \param bestGuess As for append().
+	#  \param missingOk As for append().
+	#  \param cruiseLevel As for append().
+	#  \returns The session. Its failure is \c None if the route was parsed in full.
+	def session(self, route, bestGuess = False, missingOk = False, cruiseLevel = None):
+		first = len(self.waypoints)
+		session = ParseSession(self, route, bestGuess, missingOk, cruiseLevel)
+		session._resume(None)
+		self._measure(first)
+		return session
+
+	## Appends the given route to the current route, choosing between navaids sharing a code so that
+	#  the route as a whole is as short as possible, rather than taking each navaid nearest to the
+	#  one before it. Every candidate of every waypoint is considered together with the airways
+	#  between them and the shortest consistent path is found by dynamic programming.
+	#  \param route Route to append.
+	#  \param missingOk If False, when a navaid or airway in the route is not found, a failure dict
+	#  as from append() will be returned and only the route up to that point is appended. Otherwise
+	#  it will be ignored.
+	#  \param cruiseLevel As for append().
+	#  \returns \c None on success, otherwise a failure dict.
+	def solve(self, route, missingOk = False, cruiseLevel = None):
+		stats = self._navdata.stats
+		if stats is not None:
+			start = time.perf_counter()
+		first = len(self.waypoints)
+		failure = self._cached(('solve', route, missingOk, cruiseLevel),
+			lambda: self._solve(route, missingOk, cruiseLevel))
+		self._measure(first)
+		if stats is not None:
+			stats.time('route.solve', time.perf_counter() - start)
+		return failure
+
+	def _solve(self, route, missingOk, cruiseLevel):
+		stats = self._navdata.stats
+		if stats is not None:
+			start = time.perf_counter()
+		tokens = route.upper().split()
+		if stats is not None:
+			stats.time('route.tokenize', time.perf_counter() - start)
+		layers, failure = self._buildLattice(tokens, missingOk, cruiseLevel)
+		if len(layers) == 0:
+			return failure
+
+		# Forward pass. Each layer keeps the best total distance to each of its candidates and the
+		# candidate and airway run of the previous layer it was reached from.
+		scores = [0.0] * len(layers[0]['candidates'])
+		for k in range(1, len(layers)):
+			layer, previous = layers[k], layers[k - 1]
+			best = [float('inf')] * len(layer['candidates'])
+			back = [None] * len(layer['candidates'])
+			if layer['edges'] is None:
+				# Direct from any candidate of the previous layer
+				for a, navaid in enumerate(previous['candidates']):
+					distances = coordsDistanceMany(navaid['coords'], layer['radians'], inRadians = True)
+					for b in range(len(best)):
+						score = scores[a] + distances[b]
+						if score < best[b]:
+							best[b], back[b] = score, (a, None)
+			else:
+				for a, b, run, distance in layer['edges']:
+					score = scores[a] + distance
+					if score < best[b]:
+						best[b], back[b] = score, (a, run)
+			layer['back'] = back
+			scores = best
+
+		# Backtrack from the best final candidate
+		b = min(range(len(scores)), key = scores.__getitem__)
+		path = [ ]
+		for k in range(len(layers) - 1, 0, -1):
+			a, run = layers[k]['back'][b]
+			path.append((b, run))
+			b = a
+		path.append((b, None))
+		path.reverse()
+
+		# Emit the waypoints
+		for layer, (b, run) in zip(layers, path):
+			if run is None:
+				self.waypoints.append(Leg(layer['candidates'][b]))
+			else:
+				airway, index, start, end = run
+				self.waypoints[-1].outAwy = airway
+				self.waypoints += self._navdata.airwayWaypoints(airway, start, end, index)
+		return failure
+
+	# Builds the candidate lattice for solve(). Returns a list of layers, one per waypoint token, and
+	# the failure dict for the first token that could not be resolved, if any.
+	def _buildLattice(self, tokens, missingOk, cruiseLevel):
+		navdata = self._navdata
+		layers = [ ]
+		direct = False
+		i = 0
+		while i != len(tokens):
+			token = tokens[i]
+			if layers and not direct and i != len(tokens) - 1:
+				if token == 'DCT' or token == 'SID' or token == 'STAR':
+					direct = True
+					i += 1
+					continue
+
+				# Try the token as an airway to the next token
+				if token in navdata.airways:
+					if navdata.stats is not None:
+						start = time.perf_counter()
+					layer = self._airwayLayer(layers[-1], token, tokens[i + 1], False,
+						cruiseLevel)
+					used = 2
+					if layer is None and tokens[i + 1] in navdata.airways:
+						# Straight onto another airway
+						layer = self._airwayLayer(layers[-1], token, tokens[i + 1], True,
+							cruiseLevel)
+						used = 1
+					if navdata.stats is not None:
+						navdata.stats.time('route.airway', time.perf_counter() - start)
+					if layer is not None:
+						layers.append(layer)
+						i += used
+						continue
+
+			direct = False
+			if token in navdata.navaids:
+				if navdata.stats is not None:
+					start = time.perf_counter()
+				candidates = navdata.navaids[token]
+				layers.append(dict(code = token, candidates = candidates, edges = None,
+					radians = navdata.navaidRadians(token)))
+				if navdata.stats is not None:
+					navdata.stats.time('route.candidates', time.perf_counter() - start)
+					navdata.stats.count('candidates', len(candidates))
+			elif not missingOk:
+				navaid, wp1, wp2 = True, None, None
+				if layers and i != len(tokens) - 1:
+					navaid, wp1, wp2 = False, tokens[i - 1], tokens[i + 1]
+				# Suggest navaids near the first candidate of the last waypoint
+				coords = layers[-1]['candidates'][0]['coords'] if layers else None
+				return layers, dict(remaining = ' '.join(tokens[i:]), navaid = navaid, code = token,
+					choices = [ ], suggestions = navdata.suggestNavaids(token, coords), wp1 = wp1,
+					wp2 = wp2)
+			i += 1
+
+		return layers, None
+
+	# Builds a layer reached along an airway from the candidates of the previous layer, or returns
+	# None if the airway does not join any of them to the destination. If crossing is set the
+	# destination is an airway crossing this one, and the candidates are where they cross. Only the
+	# candidates the route can reach are followed from: those of an airway layer which no edge leads
+	# to are left out, as a path through them could never be chosen.
+	def _airwayLayer(self, previous, airway, dest, crossing = False, cruiseLevel = None):
+		navdata = self._navdata
+		if crossing:
+			candidates, findRun = [ ], navdata._findIntersectionRun
+		else:
+			candidates, findRun = list(navdata.navaids.get(dest, [ ])), navdata._findAirwayRun
+		reached = previous.get('reached')
+		edges = [ ]
+		for a, navaid in enumerate(previous['candidates']):
+			if reached is not None and a not in reached:
+				continue
+			if navdata.stats is not None:
+				navdata.stats.count('airwayProbes')
+			run = findRun(airway, navaid, dest, cruiseLevel)
+			if run[0] is None:
+				continue
+			# Find the candidate at the end of the run, adding the airway's navaid if the navaid data
+			# doesn't have it
+			endpoint = run[0]['waypoints'][run[3]]['navaid']
+			for b, candidate in enumerate(candidates):
+				if sameNavaid(candidate, endpoint):
+					break
+			else:
+				b = len(candidates)
+				candidates.append(endpoint)
+			edges.append((a, b, run, run[1].distance(run[2], run[3])))
+		if len(edges) == 0:
+			return None
+		return dict(code = dest, candidates = candidates, edges = edges,
+			reached = set(b for a, b, run, distance in edges))
+
+	# Runs a parse through the navdata's route cache, if it is enabled. The cache holds copies of the
+	# waypoints and failure so that callers changing their results can't affect it.
+	def _cached(self, key, parse):
+		cache = self._navdata.routeCache
+		if cache is None:
+			return parse()
+		key = (key[0], ' '.join(key[1].upper().split())) + key[2:]
+
+		entry = cache.get(key)
+		if self._navdata.stats is not None:
+			self._navdata.stats.count('routeCache.misses' if entry is None else 'routeCache.hits')
+		if entry is None:
+			first = len(self.waypoints)
+			failure = parse()
+			entry = (_copyWaypoints(self.waypoints[first:]), _copyFailure(failure))
+			cache.put(key, entry)
+			return failure
+		self.waypoints += _copyWaypoints(entry[0])
+		return _copyFailure(entry[1])
+
+	## Returns the total distance of the route in nautical miles.
+	def totalDistance(self):
+		if len(self.waypoints) == 0:
+			return 0.0
+		return self.waypoints[-1].cumDistance
+
+	## Returns the distance of each leg in nautical miles, from the previous waypoint to each
+	#  waypoint; the first is 0. This is an array if NumPy is available, otherwise a list.
+	def legDistances(self):
+		distances = [waypoint.distance for waypoint in self.waypoints]
+		if numpy is not None:
+			return numpy.array(distances, dtype = float)
+		return distances
+
+	## Returns the position a given distance along the route, following the great circle of the leg
+	#  it falls in.
+	#  \param distance Distance from the first waypoint in nautical miles.
+	#  \returns The position as a (lat, lon) tuple, or \c None if the distance is beyond either end
+	#  of the route.
+	def positionAt(self, distance):
+		waypoints = self.waypoints
+		if len(waypoints) == 0 or distance < 0 or distance > waypoints[-1].cumDistance:
+			return None
+		# Find the first waypoint at or beyond the distance
+		low, high = 0, len(waypoints) - 1
+		while low < high:
+			middle = (low + high) // 2
+			if waypoints[middle].cumDistance < distance:
+				low = middle + 1
+			else:
+				high = middle
+		waypoint = waypoints[low]
+		if low == 0 or waypoint.cumDistance == distance:
+			return tuple(waypoint['coords'])
+		fraction = 1 - (waypoint.cumDistance - distance) / waypoint.distance
+		return coordsBetween(waypoints[low - 1]['coords'], waypoint['coords'], fraction)
+
+	# Works out the leg and cumulative distances of the waypoints from the given index on. Airway
+	# legs already have their distances from the airway index.
+	def _measure(self, first):
+		waypoints = self.waypoints
+		for n in range(first, len(waypoints)):
+			if n == 0:
+				waypoints[n].distance = 0.0
+				waypoints[n].cumDistance = 0.0
+			else:
+				previous = waypoints[n - 1]
+				if waypoints[n].distance is None:
+					waypoints[n].distance = coordsDistance(previous['coords'], waypoints[n]['coords'])
+				waypoints[n].cumDistance = previous.cumDistance + waypoints[n].distance
+
+	# Follows an airway from a navaid to the next token, which is either a navaid on the airway or
+	# another airway crossing it. Returns the number of tokens used (2 for the airway and the navaid,
+	# 1 for just the airway when it is followed to the crossing, or 0 if it couldn't be followed) and
+	# the last waypoint.
+	def _followAirway(self, airway, src, next, cruiseLevel = None):
+		found, lastWaypoint = self._findAirway(airway, src, next, False, cruiseLevel)
+		if found:
+			return 2, lastWaypoint
+		if next in self._navdata.airways:
+			found, lastWaypoint = self._findAirway(airway, src, next, True, cruiseLevel)
+			if found:
+				return 1, lastWaypoint
+		return 0, src
+
 	## Finds the given airway and appends the waypoints to the route if found.
+	#  \param crossing If \c True, \p dest is an airway and the waypoints up to where it crosses
+	#  are appended.
+	#  \param cruiseLevel If not \c None, the flight level the airway must be open at.
 	#  \returns If the airway was found, True and the final navaid, otherwise, False and \c src.
-	def _findAirway(self, airway, src, dest):
-		waypoints, airway = self._navdata.findAirway(airway, src, dest)
+	def _findAirway(self, airway, src, dest, crossing = False, cruiseLevel = None):
+		stats = self._navdata.stats
+		if stats is not None:
+			start = time.perf_counter()
+		if crossing:
+			waypoints, airway = self._navdata.findAirwayIntersection(airway, src, dest, cruiseLevel)
+		else:
+			waypoints, airway = self._navdata.findAirway(airway, src, dest, cruiseLevel)
+		if stats is not None:
+			stats.time('route.airway', time.perf_counter() - start)
+			stats.count('airwayProbes')
 		if waypoints is None or airway is None:
 			return False, src
 		else:
-			self.waypoints[-1]['outAwy'] = airway
+			self.waypoints[-1].outAwy = airway
 			self.waypoints += waypoints
 			return True, waypoints[-1]
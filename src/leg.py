@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from collections.abc import Mapping
+
+## Waypoint of a route. It refers to the shared navaid rather than copying it and holds only the
+#  data particular to the route: the airways into and out of the waypoint and the distances to it.
+#  It reads as a dict holding the navaid's fields as well as inAwy, outAwy, distance and
+#  cumDistance; only the latter four can be set.
+class Leg(Mapping):
+	__slots__ = ('navaid', 'inAwy', 'outAwy', 'distance', 'cumDistance')
+
+	_FIELDS = ('inAwy', 'outAwy', 'distance', 'cumDistance')
+
+	## Constructor.
+	#  \param navaid Navaid of the waypoint.
+	#  \param inAwy Airway leading to the waypoint, or \c None.
+	#  \param outAwy Airway leading from the waypoint, or \c None.
+	#  \param distance Length of the leg to the waypoint in nautical miles, if known.
+	#  \param cumDistance Distance from the start of the route in nautical miles, if known.
+	def __init__(self, navaid, inAwy = None, outAwy = None, distance = None, cumDistance = None):
+		# Don't nest legs
+		if isinstance(navaid, Leg):
+			navaid = navaid.navaid
+		self.navaid = navaid
+		self.inAwy = inAwy
+		self.outAwy = outAwy
+		self.distance = distance
+		self.cumDistance = cumDistance
+
+	def __getitem__(self, field):
+		if field in self._FIELDS:
+			return getattr(self, field)
+		return self.navaid[field]
+
+	def __setitem__(self, field, value):
+		if field not in self._FIELDS:
+			raise KeyError('{0} is a navaid field and cannot be set on a leg'.format(field))
+		setattr(self, field, value)
+
+	def __iter__(self):
+		yield from self.navaid
+		yield from self._FIELDS
+
+	def __len__(self):
+		return len(self.navaid) + len(self._FIELDS)
+
+	def __contains__(self, field):
+		return field in self._FIELDS or field in self.navaid
+
+	## Returns a new leg for the same navaid with the same airways and distances.
+	def copy(self):
+		return Leg(self.navaid, self.inAwy, self.outAwy, self.distance, self.cumDistance)
+
+	def __repr__(self):
+		return 'Leg({0!r}, inAwy = {1}, outAwy = {2}, distance = {3!r})'.format(self.navaid,
+			_airwayName(self.inAwy), _airwayName(self.outAwy), self.distance)
+
+def _airwayName(airway):
+	return None if airway is None else airway['code']
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from collections import OrderedDict
+
+## Bounded mapping that evicts the least recently used entry when full, and counts its hits and
+#  misses.
+class LruCache:
+	## Constructor.
+	#  \param maxsize Maximum number of entries.
+	def __init__(self, maxsize):
+		if maxsize < 1:
+			raise ValueError('maxsize must be at least 1')
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+
+	## Returns the entry for the given key, or \p default if there isn't one.
+	def get(self, key, default = None):
+		try:
+			value = self._entries[key]
+		except KeyError:
+			self.misses += 1
+			return default
+		self._entries.move_to_end(key)
+		self.hits += 1
+		return value
+
+	## Adds or replaces an entry, evicting the least recently used entry if the cache is full.
+	def put(self, key, value):
+		self._entries[key] = value
+		self._entries.move_to_end(key)
+		if len(self._entries) > self.maxsize:
+			self._entries.popitem(last = False)
+
+	## Removes all entries. The hit and miss counts are kept.
+	def clear(self):
+		self._entries.clear()
+
+	## Returns the hit and miss counts and the number of entries.
+	def stats(self):
+		return dict(hits = self.hits, misses = self.misses, size = len(self._entries),
+			maxsize = self.maxsize)
+
+	def __len__(self):
+		return len(self._entries)
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+
+## Version of the binary cache format. Bump this whenever the layout changes so that old caches are
+#  rebuilt rather than misread.
+CACHE_VERSION = 2
+
+_MAGIC = b'IFRNAVC\0'
+# Written in native byte order so that a cache from a machine of the other endianness is rejected
+_BYTE_ORDER = 0x01020304
+
+# The tables are stored as columns, each an array in native byte order with the given typecode.
+# Strings are stored as indexes into the string pool.
+_IDENT_COLUMNS = (('ident', 'I'), ('first', 'I'), ('count', 'I'))
+_NAVAID_COLUMNS = (('type', 'B'), ('lat', 'd'), ('lon', 'd'), ('elevation', 'i'), ('freq', 'i'),
+	('recRange', 'i'), ('extra', 'd'), ('code', 'I'), ('name', 'I'))
+_AIRWAY_COLUMNS = (('code', 'I'), ('high', 'B'), ('first', 'I'), ('count', 'I'))
+_WAYPOINT_COLUMNS = (('code', 'I'), ('lat', 'd'), ('lon', 'd'), ('base', 'i'), ('top', 'i'))
+
+def _columnSections(table, columns):
+	return [(table + '.' + name, typecode) for name, typecode in columns]
+
+# Sections in file order with their typecodes; None for raw bytes. Ident hash slots hold the ident
+# entry index plus one, with zero marking an empty slot.
+_SECTIONS = [('sources', None), ('strings', None), ('strings.offsets', 'I')] + \
+	_columnSections('navaidIdents', _IDENT_COLUMNS) + [('navaidIdents.slots', 'I')] + \
+	_columnSections('navaids', _NAVAID_COLUMNS) + \
+	_columnSections('airwayIdents', _IDENT_COLUMNS) + [('airwayIdents.slots', 'I')] + \
+	_columnSections('airways', _AIRWAY_COLUMNS) + \
+	_columnSections('waypoints', _WAYPOINT_COLUMNS)
+
+_HEADER = struct.Struct('=8sII{0}Q'.format(len(_SECTIONS) * 2))
+
+# Stands in for a base or top of None
+_NONE = -0x80000000
+
+_TYPES = ('fix', 'ndb', 'vor', 'dme', 'apt')
+_TYPE_CODES = dict((type, code) for code, type in enumerate(_TYPES))
+
+# Fields of each type of navaid, in the order the parser produces them. Airports have no type field.
+_NAVAID_FIELDS = dict(
+	fix = ('type', 'coords', 'code'),
+	ndb = ('type', 'coords', 'elevation', 'freq', 'recRange', 'code', 'name'),
+	vor = ('type', 'coords', 'elevation', 'freq', 'recRange', 'sVar', 'code', 'name'),
+	dme = ('type', 'coords', 'elevation', 'freq', 'recRange', 'dmeBias', 'code', 'name'),
+	apt = ('coords', 'elevation', 'code', 'name'))
+
+## Returns the fingerprint of a navdata source file, used to detect stale caches.
+#  \param path Path to the source file.
+#  \param hash If \c True the SHA-1 of the file contents is included.
+def fileFingerprint(path, hash = True):
+	st = os.stat(path)
+	fingerprint = dict(size = st.st_size, mtime = st.st_mtime_ns)
+	if hash:
+		sha1 = hashlib.sha1()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				sha1.update(block)
+		fingerprint['sha1'] = sha1.hexdigest()
+	return fingerprint
+
+## Checks whether a source file still matches the fingerprint stored in a cache. The file is only
+#  hashed if its modification time has changed but its size has not.
+def fingerprintMatches(path, fingerprint):
+	try:
+		current = fileFingerprint(path, False)
+	except OSError:
+		return False
+	if current['size'] != fingerprint['size']:
+		return False
+	if current['mtime'] == fingerprint['mtime']:
+		return True
+	return fileFingerprint(path)['sha1'] == fingerprint['sha1']
+
+def _hash(key):
+	return zlib.crc32(key)
+
+## Builds the string pool, deduplicating repeated strings.
+class _StringPool:
+	def __init__(self):
+		self._ids = { }
+		self._data = bytearray()
+		self.offsets = array('I', [0])
+
+	def add(self, string):
+		if string in self._ids:
+			return self._ids[string]
+		self._data += string.encode('utf-8')
+		self.offsets.append(len(self._data))
+		self._ids[string] = len(self._ids)
+		return self._ids[string]
+
+	def bytes(self):
+		return bytes(self._data)
+
+# Columns of a table being packed
+class _Columns:
+	def __init__(self, table, columns):
+		self._table = table
+		self._arrays = [(name, array(typecode)) for name, typecode in columns]
+
+	def append(self, *values):
+		for (name, column), value in zip(self._arrays, values):
+			column.append(value)
+
+	def sections(self):
+		return dict((self._table + '.' + name, column) for name, column in self._arrays)
+
+# Packs an ident table and its hash slots from a list of (ident, first, count) entries
+def _packIdents(table, strings, entries):
+	columns = _Columns(table, _IDENT_COLUMNS)
+	slotCount = 1
+	while slotCount < len(entries) * 2:
+		slotCount *= 2
+	slots = array('I', [0]) * slotCount
+	for n, (ident, first, count) in enumerate(entries):
+		columns.append(strings.add(ident), first, count)
+		slot = _hash(ident.encode('utf-8')) & (slotCount - 1)
+		while slots[slot] != 0:
+			slot = (slot + 1) & (slotCount - 1)
+		slots[slot] = n + 1
+	sections = columns.sections()
+	sections[table + '.slots'] = slots
+	return sections
+
+## Serialises navaids and airways into the binary cache format.
+#  \param navaids Navaids mapping as stored in NavData.
+#  \param airways Airways mapping as stored in NavData.
+#  \param sources Fingerprints of the source files, keyed by file name.
+#  \returns The cache contents as \c bytes.
+def packNavData(navaids, airways, sources):
+	strings = _StringPool()
+	sections = { }
+
+	navaidEntries = [ ]
+	columns = _Columns('navaids', _NAVAID_COLUMNS)
+	count = 0
+	for ident, records in navaids.items():
+		navaidEntries.append((ident, count, len(records)))
+		for navaid in records:
+			type = navaid.get('type', 'apt')
+			extra = navaid.get('sVar', navaid.get('dmeBias', 0.0))
+			columns.append(_TYPE_CODES[type], navaid['coords'][0], navaid['coords'][1],
+				navaid.get('elevation', 0), navaid.get('freq', 0), navaid.get('recRange', 0), extra,
+				strings.add(navaid['code']), strings.add(navaid.get('name', '')))
+			count += 1
+	sections.update(columns.sections())
+	sections.update(_packIdents('navaidIdents', strings, navaidEntries))
+
+	airwayEntries = [ ]
+	columns = _Columns('airways', _AIRWAY_COLUMNS)
+	waypointColumns = _Columns('waypoints', _WAYPOINT_COLUMNS)
+	count, waypointCount = 0, 0
+	for ident, records in airways.items():
+		airwayEntries.append((ident, count, len(records)))
+		for airway in records:
+			columns.append(strings.add(airway['code']), airway['high'], waypointCount,
+				len(airway['waypoints']))
+			for waypoint in airway['waypoints']:
+				base, top = waypoint['base'], waypoint['top']
+				waypointColumns.append(strings.add(waypoint['navaid']['code']),
+					waypoint['navaid']['coords'][0], waypoint['navaid']['coords'][1],
+					_NONE if base is None else base, _NONE if top is None else top)
+				waypointCount += 1
+			count += 1
+	sections.update(columns.sections())
+	sections.update(waypointColumns.sections())
+	sections.update(_packIdents('airwayIdents', strings, airwayEntries))
+
+	sections['sources'] = json.dumps(sources, sort_keys = True).encode('utf-8')
+	sections['strings'] = strings.bytes()
+	sections['strings.offsets'] = strings.offsets
+
+	# Sections are aligned to 8 bytes so the columns can be read in place
+	table, chunks = [ ], [ ]
+	offset = _HEADER.size + (-_HEADER.size % 8)
+	for name, typecode in _SECTIONS:
+		section = sections[name]
+		if typecode is not None:
+			section = section.tobytes()
+		table += [offset, len(section)]
+		chunks += [section, bytes(-len(section) % 8)]
+		offset += len(section) + (-len(section) % 8)
+	header = _HEADER.pack(_MAGIC, CACHE_VERSION, _BYTE_ORDER, *table)
+	return b''.join([header, bytes(-len(header) % 8)] + chunks)
+
+## Writes navaids and airways to a binary cache file. The file is replaced atomically.
+def writeCache(path, navaids, airways, sources):
+	data = packNavData(navaids, airways, sources)
+	temp = '{0}.tmp{1}'.format(path, os.getpid())
+	with open(temp, 'wb') as f:
+		f.write(data)
+	os.replace(temp, path)
+
+## Read-only view of the flat tables in a binary cache. Records are read from the columns in place
+#  when they are accessed.
+class NavTables:
+	## Constructor.
+	#  \param buffer Buffer holding the cache contents, e.g. an \c mmap or \c bytes.
+	def __init__(self, buffer):
+		self._buffer = buffer
+		view = memoryview(buffer)
+		if len(view) < _HEADER.size:
+			raise ValueError('navdata cache truncated')
+		header = _HEADER.unpack_from(view, 0)
+		if header[0] != _MAGIC:
+			raise ValueError('not a navdata cache')
+		self.version = header[1]
+		if self.version != CACHE_VERSION:
+			raise ValueError('unsupported navdata cache version {0}'.format(self.version))
+		if header[2] != _BYTE_ORDER:
+			raise ValueError('navdata cache has the wrong byte order')
+
+		## Columns by section name
+		self.columns = { }
+		for n, (name, typecode) in enumerate(_SECTIONS):
+			offset, length = header[3 + n * 2], header[4 + n * 2]
+			if offset + length > len(view):
+				raise ValueError('navdata cache truncated')
+			section = view[offset:offset + length]
+			self.columns[name] = section if typecode is None else section.cast(typecode)
+		self.sources = json.loads(bytes(self.columns['sources']).decode('utf-8'))
+		self._strings = self.columns['strings']
+		self._stringOffsets = self.columns['strings.offsets']
+
+		## Mapping of navaid codes to lists of navaid records
+		self.navaids = _NavaidTable(self)
+		## Mapping of airway codes to lists of airway records
+		self.airways = _AirwayTable(self)
+
+	## Opens a cache file with \c mmap.
+	@classmethod
+	def open(cls, path):
+		with open(path, 'rb') as f:
+			buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		return cls(buffer)
+
+	## Returns every navaid record, without going through the ident index.
+	def allNavaids(self):
+		return (NavaidRecord(self, n) for n in range(len(self.columns['navaids.type'])))
+
+	def _string(self, n):
+		return bytes(self._strings[self._stringOffsets[n]:self._stringOffsets[n + 1]]).decode('utf-8')
+
+# Base for the read-only record views. They behave as dicts for reading.
+class _Record(Mapping):
+	__slots__ = ('_tables', '_n')
+
+	def __init__(self, tables, n):
+		self._tables = tables
+		self._n = n
+
+	def __len__(self):
+		return len(self._fields())
+
+	def __iter__(self):
+		return iter(self._fields())
+
+	## Returns a \c dict holding the fields of the record.
+	def copy(self):
+		return dict((field, self[field]) for field in self._fields())
+
+	def __repr__(self):
+		return repr(self.copy())
+
+## Navaid record in a cache, read as a dict with the same fields as a parsed navaid.
+class NavaidRecord(_Record):
+	__slots__ = ()
+
+	def _fields(self):
+		return _NAVAID_FIELDS[_TYPES[self._tables.columns['navaids.type'][self._n]]]
+
+	def __getitem__(self, field):
+		columns, n = self._tables.columns, self._n
+		if field == 'coords':
+			return (columns['navaids.lat'][n], columns['navaids.lon'][n])
+		if field == 'code':
+			return self._tables._string(columns['navaids.code'][n])
+		if field not in self._fields():
+			raise KeyError(field)
+		if field == 'type':
+			return _TYPES[columns['navaids.type'][n]]
+		if field == 'name':
+			return self._tables._string(columns['navaids.name'][n])
+		if field == 'sVar' or field == 'dmeBias':
+			return columns['navaids.extra'][n]
+		return columns['navaids.' + field][n]
+
+## Airway record in a cache, read as a dict with code, high and waypoints fields.
+class AirwayRecord(_Record):
+	__slots__ = ('_waypoints', )
+
+	def __init__(self, tables, n):
+		_Record.__init__(self, tables, n)
+		columns = tables.columns
+		self._waypoints = _WaypointList(tables, columns['airways.first'][n],
+			columns['airways.count'][n])
+
+	def _fields(self):
+		return ('code', 'high', 'waypoints')
+
+	def __getitem__(self, field):
+		if field == 'waypoints':
+			return self._waypoints
+		if field == 'code':
+			return self._tables._string(self._tables.columns['airways.code'][self._n])
+		if field == 'high':
+			return bool(self._tables.columns['airways.high'][self._n])
+		raise KeyError(field)
+
+# Waypoints of an airway record, read as a list
+class _WaypointList(Sequence):
+	__slots__ = ('_tables', '_first', '_count')
+
+	def __init__(self, tables, first, count):
+		self._tables = tables
+		self._first = first
+		self._count = count
+
+	def __len__(self):
+		return self._count
+
+	def __getitem__(self, n):
+		if isinstance(n, slice):
+			return [_WaypointRecord(self._tables, self._first + m) for m in range(*n.indices(self._count))]
+		if n < 0:
+			n += self._count
+		if n < 0 or n >= self._count:
+			raise IndexError('waypoint index out of range')
+		return _WaypointRecord(self._tables, self._first + n)
+
+	def __eq__(self, other):
+		return isinstance(other, (list, Sequence)) and list(self) == list(other)
+
+	def __repr__(self):
+		return repr(list(self))
+
+# Airway waypoint in a cache, read as a dict with base, top and navaid fields
+class _WaypointRecord(_Record):
+	__slots__ = ()
+
+	def _fields(self):
+		return ('base', 'top', 'navaid')
+
+	def __getitem__(self, field):
+		if field == 'navaid':
+			return _WaypointNavaid(self._tables, self._n)
+		if field == 'base' or field == 'top':
+			value = self._tables.columns['waypoints.' + field][self._n]
+			return None if value == _NONE else value
+		raise KeyError(field)
+
+# Navaid of an airway waypoint in a cache, read as a dict with code and coords fields
+class _WaypointNavaid(_Record):
+	__slots__ = ()
+
+	def _fields(self):
+		return ('code', 'coords')
+
+	def __getitem__(self, field):
+		columns, n = self._tables.columns, self._n
+		if field == 'coords':
+			return (columns['waypoints.lat'][n], columns['waypoints.lon'][n])
+		if field == 'code':
+			return self._tables._string(columns['waypoints.code'][n])
+		raise KeyError(field)
+
+# Base for the ident-keyed tables
+class _IdentTable(Mapping):
+	_table = None
+
+	def __init__(self, tables):
+		self._tables = tables
+		self._idents = tables.columns[self._table + '.ident']
+		self._first = tables.columns[self._table + '.first']
+		self._count = tables.columns[self._table + '.count']
+		self._slots = tables.columns[self._table + '.slots']
+
+	# Returns the ident entry for the given ident, or None
+	def _find(self, ident):
+		if not isinstance(ident, str):
+			return None
+		key = ident.encode('utf-8')
+		strings, offsets = self._tables._strings, self._tables._stringOffsets
+		mask = len(self._slots) - 1
+		slot = _hash(key) & mask
+		while True:
+			entry = self._slots[slot]
+			if entry == 0:
+				return None
+			string = self._idents[entry - 1]
+			if strings[offsets[string]:offsets[string + 1]] == key:
+				return entry - 1
+			slot = (slot + 1) & mask
+
+	def __getitem__(self, ident):
+		entry = self._find(ident)
+		if entry is None:
+			raise KeyError(ident)
+		first = self._first[entry]
+		return [self._record(n) for n in range(first, first + self._count[entry])]
+
+	def __contains__(self, ident):
+		return self._find(ident) is not None
+
+	def __iter__(self):
+		for string in self._idents:
+			yield self._tables._string(string)
+
+	def __len__(self):
+		return len(self._idents)
+
+class _NavaidTable(_IdentTable):
+	_table = 'navaidIdents'
+
+	def _record(self, n):
+		return NavaidRecord(self._tables, n)
+
+# Airway records are kept once looked up, so that the same airway is always the same object as
+# with parsed navdata
+class _AirwayTable(_IdentTable):
+	_table = 'airwayIdents'
+
+	def __init__(self, tables):
+		_IdentTable.__init__(self, tables)
+		self._records = { }
+
+	def __getitem__(self, ident):
+		if ident not in self._records:
+			self._records[ident] = _IdentTable.__getitem__(self, ident)
+		return self._records[ident]
+
+	def _record(self, n):
+		return AirwayRecord(self._tables, n)
@@ -2,26 +2,213 @@
 # coding=utf-8
 
 import os
-import re
 import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from itertools import accumulate
+from multiprocessing import resource_tracker, shared_memory
 from pprint import pprint
 
+from aptindex import AirportIndex, LazyNavaids
+from identindex import IdentIndex
+from leg import Leg
+from geo import argsortDistances, coordsDistance, coordsDistanceMany, coordsRadians, pathDistances
+from lrucache import LruCache
+from navcache import NavTables, fileFingerprint, fingerprintMatches, packNavData, writeCache
+from navparse import parseFiles
+from spatial import SpatialGrid
+from stats import Stats
+
+## Data files making up the navdata, in the order they are parsed.
+FILES = ('earth_awy.dat', 'earth_fix.dat', 'earth_nav.dat', 'apt.dat')
+
+## Joins airway segments sharing an identifier into airways.
+#  Each segment is joined to the tail of the airway being built, and then to its head, taking the
+#  earliest remaining segment touching that end. Segments are found through an index of their
+#  endpoints rather than by scanning, so this is linear in the number of segments.
+#  \param ident Airway identifier.
+#  \param segments Segments in file order, as read from awy.dat.
+#  \returns A list of airways.
+def assembleAirways(ident, segments):
+	# Index the segments by each endpoint. The deques hold segment indices in file order; used
+	# segments are skipped lazily when they reach the front.
+	ends = { }
+	for n, segment in enumerate(segments):
+		for navaid in segment['waypoints']:
+			key = (navaid['code'], navaid['coords'], segment['high'])
+			if key in ends:
+				ends[key].append(n)
+			else:
+				ends[key] = deque([n])
+	used = [False] * len(segments)
+
+	# Returns the earliest unused segment touching the given navaid, or None
+	def take(navaid, high):
+		candidates = ends.get((navaid['code'], navaid['coords'], high))
+		while candidates:
+			n = candidates.popleft()
+			if not used[n]:
+				used[n] = True
+				return segments[n]
+		return None
+
+	airways = [ ]
+	for n, first in enumerate(segments):
+		if used[n]:
+			continue
+		used[n] = True
+		high = first['high']
+		waypoints = deque([
+			dict(
+				base   = first['base'],
+				top    = first['top'],
+				navaid = first['waypoints'][0]),
+			dict(
+				base   = None,
+				top    = None,
+				navaid = first['waypoints'][1])])
+
+		# Extend from the tail
+		while True:
+			tail = waypoints[-1]
+			segment = take(tail['navaid'], high)
+			if segment is None:
+				break
+			# Flip the source and destination around if necessary
+			if segment['waypoints'][1] == tail['navaid']:
+				navaid = segment['waypoints'][0]
+			else:
+				navaid = segment['waypoints'][1]
+			tail['base'] = segment['base']
+			tail['top']  = segment['top']
+			waypoints.append(dict(
+				base   = None,
+				top    = None,
+				navaid = navaid))
+
+		# End of airway; continue in the other direction
+		while True:
+			head = waypoints[0]
+			segment = take(head['navaid'], high)
+			if segment is None:
+				break
+			if segment['waypoints'][0] == head['navaid']:
+				navaid = segment['waypoints'][1]
+			else:
+				navaid = segment['waypoints'][0]
+			waypoints.appendleft(dict(
+				base   = segment['base'],
+				top    = segment['top'],
+				navaid = navaid))
+
+		airways.append(dict(
+			code      = ident,
+			high      = high,
+			waypoints = list(waypoints)))
+	return airways
+
+## Positions of the navaids along an airway, used to slice out the waypoints between two navaids
+#  without walking the airway, and the runs of segments open at each flight level.
+class _AirwayIndex:
+	__slots__ = ('positions', 'cumDistance', '_coords', '_levels', '_closed')
+
+	## Distance in degrees within which an airway waypoint is taken to be the same navaid as one from
+	#  the navaid data, which may be rounded differently.
+	TOLERANCE = 0.01
+
+	## Constructor.
+	#  \param airway Airway to index.
+	#  \param measure If \c False the distances are left for measure().
+	def __init__(self, airway, measure = True):
+		# Navaid code -> positions on the airway, normally just one
+		self.positions = { }
+		self._coords = [ ]
+		# Base and top of each segment, from the waypoint it starts at
+		segments = [ ]
+		for n, waypoint in enumerate(airway['waypoints']):
+			code = waypoint['navaid']['code']
+			self.positions[code] = self.positions.get(code, ()) + (n,)
+			self._coords.append(waypoint['navaid']['coords'])
+			segments.append((waypoint['base'], waypoint['top']))
+		segments.pop()
+		## Distance from the first waypoint to each position, in nautical miles
+		self.cumDistance = None
+		if measure:
+			self.measure(pathDistances(self._coords))
+
+		# The segments open at a level only change where a segment's base or top is crossed, so the
+		# levels are split into bands at those points, and the segments closed in each band listed
+		bounds = set()
+		for base, top in set(segments):
+			if base is not None:
+				bounds.update((base, top + 1))
+		self._levels = sorted(bounds)
+		self._closed = [[n for n, (base, top) in enumerate(segments)
+			if base is None or not base <= level <= top] for level in self._levels[:-1]]
+
+	## Sets the distances along the airway from the distances of its legs.
+	def measure(self, distances):
+		self.cumDistance = list(accumulate(distances, initial = 0.0))
+
+	## Returns the distance along the airway between two positions, in nautical miles.
+	def distance(self, start, end):
+		return abs(self.cumDistance[end] - self.cumDistance[start])
+
+	## Returns \c True if every segment between two positions is open at the given flight level.
+	def levelOpen(self, start, end, level):
+		if start > end:
+			start, end = end, start
+		if start == end:
+			return True
+		band = bisect_right(self._levels, level) - 1
+		if band < 0 or band >= len(self._closed):
+			return False
+		closed = self._closed[band]
+		return bisect_left(closed, start) == bisect_left(closed, end)
+
+	## Returns the position of the given navaid on the airway, or \c None if it is not on it.
+	def find(self, navaid):
+		best, bestDistance = None, self.TOLERANCE ** 2
+		for n in self.positions.get(navaid['code'], ()):
+			coords = self._coords[n]
+			distance = (coords[0] - navaid['coords'][0]) ** 2 + (coords[1] - navaid['coords'][1]) ** 2
+			if distance <= bestDistance:
+				best, bestDistance = n, distance
+		return best
+
+## Checks whether two navaids are the same, allowing for rounding of their coordinates.
+def sameNavaid(a, b):
+	return a['code'] == b['code'] and \
+		(a['coords'][0] - b['coords'][0]) ** 2 + (a['coords'][1] - b['coords'][1]) ** 2 <= \
+		_AirwayIndex.TOLERANCE ** 2
+
+# Shared memory block attached to by NavData.attach(). The tables keep views of it until the process
+# exits, when it can't be closed, so it is left for the operating system to unmap.
+class _AttachedMemory(shared_memory.SharedMemory):
+	def __del__(self):
+		pass
+
 ## Provides access to the X-Plane structured navadata.
 class NavData:
 	## Constructor; specifies the path to the navdata.
 	#  \param path Path to the navdata. This must contain at least earth_awy.dat, earth_fix.dat,
 	#  earth_nav.dat and apt.dat.
-	def __init__(self, path):
+	#  \param workers If set, the files are split into chunks and parsed concurrently by this many
+	#  worker processes.
+	#  \param compact If \c True the data is stored compactly once parsed; see compact().
+	#  \param lazyAirports If \c True airports are only parsed from apt.dat when their code is first
+	#  looked up in navaids, using an index of apt.dat kept in apt.index in the navdata directory.
+	#  Using the airports in bulk, e.g. in nearest() or compact(), parses them all.
+	#  \param stats Stats to record the loading in, and to keep as the stats of the navdata; see
+	#  enableStats().
+	def __init__(self, path, workers = None, compact = False, lazyAirports = False, stats = None):
 		# Check the path and files
 		if not os.path.exists(path):
 			raise ValueError('path does not exist')
 		if not os.path.isdir(path):
 			raise ValueError('path is not a directory')
-		files = [
-			os.path.join(path, 'earth_awy.dat'),
-			os.path.join(path, 'earth_fix.dat'),
-			os.path.join(path, 'earth_nav.dat'),
-			os.path.join(path, 'apt.dat') ]
+		files = [os.path.join(path, file) for file in FILES]
 		for file in files:
 			if not os.path.exists(file):
 				raise ValueError('{0} missing'.format(file))
@@ -29,375 +216,586 @@ class NavData:
 				raise ValueError('{0} is not a file'.format(file))
 
 		# Parse the data
+		self.path = path
 		self.airways = { }
 		self.navaids = { }
+		self.stats = stats
+		if workers is not None and workers > 1:
+			print('Parsing {0} with {1} workers'.format(path, workers), file = sys.stderr)
+		if lazyAirports:
+			aptPath = files.pop()
+		start = time.perf_counter()
+		for file, type, records in parseFiles(files, workers):
+			print('Parsed {0}'.format(file), file = sys.stderr)
+			if stats is not None:
+				stats.time('load.' + type, time.perf_counter() - start)
+			self._addRecords(type, records)
+			start = time.perf_counter()
+		if lazyAirports:
+			index = AirportIndex.load(aptPath, os.path.join(path, 'apt.index'))
+			self.navaids = LazyNavaids(self.navaids, index)
+
+		# Build the indexes
+		self._tables = None
+		self.routeCache = None
+		self.airwayCache = None
+		if compact:
+			# Indexes are built as they are needed instead
+			self.compact()
+		else:
+			self._initIndexes()
+			self._buildAirwayIndexes()
+			self._intersectionIndex()
+			# So that the first route failing to parse doesn't wait for it
+			self._identIndex()
+			if not lazyAirports:
+				# Building it would parse every airport
+				self._spatialGrid()
+
+	## Loads the navdata through a binary cache. The cache is used if its format version is current
+	#  and the source files have not changed since it was written; otherwise the source files are
+	#  parsed and the cache is rebuilt.
+	#  \param path Path to the navdata.
+	#  \param cachePath Path to the cache file. Defaults to navdata.cache in the navdata directory.
+	#  \param workers Number of worker processes to parse the files with if the cache is rebuilt.
+	@classmethod
+	def load(cls, path, cachePath = None, workers = None):
+		if cachePath is None:
+			cachePath = os.path.join(path, 'navdata.cache')
+		if os.path.exists(cachePath):
+			try:
+				navdata = cls.open(cachePath)
+			except ValueError as e:
+				print('Ignoring navdata cache: {0}'.format(e), file = sys.stderr)
+			else:
+				if navdata.cacheCurrent(path):
+					navdata.path = path
+					return navdata
+				print('Navdata cache is stale', file = sys.stderr)
+
+		navdata = cls(path, workers)
+		print('Writing navdata cache {0}'.format(cachePath), file = sys.stderr)
+		navdata.saveCache(cachePath)
+		return navdata
+
+	## Opens a binary cache written by saveCache(). The cache is memory mapped and records are only
+	#  decoded when they are looked up. The cache is not checked against the source files; use
+	#  load() for that.
+	#  \param cachePath Path to the cache file.
+	@classmethod
+	def open(cls, cachePath):
+		return cls._fromTables(NavTables.open(cachePath))
+
+	## Attaches to a navdata published into shared memory by publish(), usually in another process.
+	#  Only the indexes built as they are needed take memory in this process; the records are read
+	#  from the shared tables in place. The block must stay published while the navdata is in use.
+	#  \param name Name of the shared memory block.
+	@classmethod
+	def attach(cls, name):
+		if sys.version_info >= (3, 13):
+			block = _AttachedMemory(name, track = False)
+		else:
+			# Before Python 3.13 attaching registers the block with the resource tracker, which
+			# unlinks it once the processes using the tracker have exited, while the publisher still
+			# owns the block, so the registration is withdrawn
+			block = _AttachedMemory(name)
+			resource_tracker.unregister(block._name, 'shared_memory')
+		navdata = cls._fromTables(NavTables(block.buf.toreadonly()))
+		# Keep the block mapped for as long as the navdata is used
+		navdata._sharedMemory = block
+		return navdata
+
+	## Publishes the navdata into shared memory as flat read-only tables, in the binary cache format,
+	#  for other processes to attach() to. To share through a memory mapped file instead, use
+	#  saveCache() and open().
+	#  \param name Name of the shared memory block, or \c None to have one generated.
+	#  \returns The \c SharedMemory block; its \c name is passed to attach(). The caller owns the
+	#  block and should close() and unlink() it once the attached processes are done with it.
+	def publish(self, name = None):
+		if self._tables is not None:
+			data = memoryview(self._tables._buffer)
+		else:
+			data = packNavData(self.navaids, self.airways, self._sourceFingerprints())
+		block = shared_memory.SharedMemory(name, create = True, size = len(data))
+		block.buf[:len(data)] = data
+		return block
+
+	@classmethod
+	def _fromTables(cls, tables):
+		navdata = cls.__new__(cls)
+		navdata.path = None
+		navdata.navaids = tables.navaids
+		navdata.airways = tables.airways
+		navdata._tables = tables
+		navdata.stats = None
+		navdata.routeCache = None
+		navdata.airwayCache = None
+		navdata._initIndexes()
+		return navdata
+
+	## Moves the navaids and airways into flat column tables, in the same format as the binary cache,
+	#  which takes a fraction of the memory of the dicts. The navaids and airways are then read
+	#  through lightweight record views which can be used as dicts for reading.
+	def compact(self):
+		if self._tables is not None:
+			return
+		tables = NavTables(packNavData(self.navaids, self.airways, { }))
+		self.navaids = tables.navaids
+		self.airways = tables.airways
+		self._tables = tables
+		self._initIndexes()
+
+	## Checks whether the source files of a navdata opened from a cache are unchanged.
+	#  \param path Path to the navdata the cache was built from.
+	def cacheCurrent(self, path):
+		sources = self._tables.sources
+		for file in FILES:
+			if file not in sources or not fingerprintMatches(os.path.join(path, file), sources[file]):
+				return False
+		return True
+
+	## Writes the navdata to a binary cache that can be opened with open() or load().
+	#  \param cachePath Path to the cache file.
+	def saveCache(self, cachePath):
+		writeCache(cachePath, self.navaids, self.airways, self._sourceFingerprints())
+
+	## Updates the navdata to a new cycle, changing only the navaids and airways that differ. The new
+	#  files are parsed and compared with the loaded data code by code: unchanged navaids and airways
+	#  are kept as they are, and only the airways whose segments changed are assembled again; an
+	#  airway with the same segments listed in a different order keeps its assembly. The
+	#  indexes and caches of whatever changed are dropped. A navdata read from compact tables is
+	#  copied into dicts for the update and compacted again afterwards; airports are no longer
+	#  parsed lazily after an update.
+	#  \param path Path to the new navdata.
+	#  \param workers Number of worker processes to parse the files with.
+	#  \returns A change report: a dict with 'navaids' and 'airways' entries, each a dict of the
+	#  'added', 'removed' and 'modified' codes.
+	def applyUpdate(self, path, workers = None):
+		files = [os.path.join(path, file) for file in FILES]
 		for file in files:
-			print('Parsing {0}'.format(file), file = sys.stderr)
-			self._parseData(file)
+			if not os.path.isfile(file):
+				raise ValueError('{0} missing'.format(file))
 
-	## Returns the navaids between the source and destination waypoints in an airway.
-	#  \returns A list of navaids and the airway. The list will not include the source but will
+		compact = self._tables is not None
+		if compact:
+			self.navaids = dict((code, [navaid.copy() for navaid in navaids])
+				for code, navaids in self.navaids.items())
+			self.airways = dict((code, [_airwayDict(airway) for airway in airways])
+				for code, airways in self.airways.items())
+			self._tables = None
+		elif not isinstance(self.navaids, dict):
+			self.navaids = dict(self.navaids)
+
+		navaids, awySegments = { }, { }
+		for file, type, records in parseFiles(files, workers):
+			print('Parsed {0}'.format(file), file = sys.stderr)
+			if type == 'awy':
+				awySegments = _groupSegments(records)
+			else:
+				for data in records:
+					navaids.setdefault(data['code'], [ ]).append(data)
+
+		report = dict(navaids = _diff(self.navaids, navaids, lambda old, new: old == new),
+			airways = _diff(self.airways, awySegments,
+				lambda old, new: _airwaySegments(old) == _fileSegments(new)))
+
+		for code in report['navaids']['removed']:
+			del self.navaids[code]
+		for code in report['navaids']['added'] + report['navaids']['modified']:
+			self.navaids[code] = navaids[code]
+			self._navaidRadians.pop(code, None)
+		for code in report['airways']['removed']:
+			del self.airways[code]
+		for code in report['airways']['added'] + report['airways']['modified']:
+			self.airways[code] = assembleAirways(code, awySegments[code])
+			self._airwayIndexes.pop(code, None)
+
+		self.path = path
+		if compact:
+			self.compact()
+		else:
+			if any(report['navaids'].values()):
+				self._grid = None
+			if report['navaids']['added'] or report['navaids']['removed']:
+				self._idents = None
+			if any(report['airways'].values()):
+				self._graph = None
+				self._intersections = None
+			if self.routeCache is not None:
+				self.routeCache.clear()
+				self.airwayCache.clear()
+		return report
+
+	# Returns the fingerprints of the source files, if the navdata was parsed from them
+	def _sourceFingerprints(self):
+		sources = { }
+		if self.path is not None:
+			for file in FILES:
+				sources[file] = fileFingerprint(os.path.join(self.path, file))
+		return sources
+
+	## Returns the legs between the source and destination waypoints in an airway.
+	#  \param code Airway identifier.
+	#  \param src Source navaid. This must be on the airway; navaids sharing its code elsewhere are
+	#  not matched.
+	#  \param dest Code of the destination navaid.
+	#  \param cruiseLevel If not \c None, only airways whose segments between the source and
+	#  destination are all open at this flight level (in hundreds of feet, e.g. 350) are used.
+	#  \returns A list of legs and the airway. The list will not include the source but will
 	# include the destination. \c None and \c None is returned if the airway could not be found
-	def findAirway(self, code, src, dest):
-		if code not in self.airways:
+	def findAirway(self, code, src, dest, cruiseLevel = None):
+		airway, index, start, end = self._findAirwayRun(code, src, dest, cruiseLevel)
+		if airway is None:
 			return None, None
-		airways = self.airways[code]
-
-		# FIXME: This shouldn't be checking the code for the source
-		for airway in airways:
-			foundSrc, foundDest, reverse = False, False, False
-			waypoints = [ ]
-
-			for waypoint in airway['waypoints']:
-				if waypoint['navaid']['code'] == src['code']:
-					if foundDest:
-						# The destination was found first; we've now found the source so we are
-						# finished
-						waypoints.reverse()
-						return waypoints, airway
-					foundSrc = True
-				elif waypoint['navaid']['code'] == dest:
-					waypoint = waypoint['navaid'].copy()
-					waypoint.update(inAwy = airway, outAwy = None)
-					waypoints.append(waypoint)
-					if foundSrc:
-						# Found the source first; we are finished
-						return waypoints, airway
-					foundDest = True
-				elif foundSrc or foundDest:
-					# We are somewhere between the source and destination
-					if len(waypoints) != 0:
-						waypoints[-1]['outAwy'] = airway
-					waypoint = waypoint['navaid'].copy()
-					waypoint.update(inAwy = airway, outAwy = None)
-					waypoints.append(waypoint)
-
-		return None, None
-
-	# Parses and stores the data in the give file
-	def _parseData(self, path):
-		if path.endswith('awy.dat'):
-			type, version = 'awy', '640'
-		elif path.endswith('fix.dat'):
-			type, version = 'fix', '600'
-		elif path.endswith('nav.dat'):
-			type, version = 'nav', '810'
-		elif path.endswith('apt.dat'):
-			type, version = 'apt', '850'
+		return self.airwayWaypoints(airway, start, end, index), airway
+
+	## Returns the waypoints of an airway between two positions as legs, in the form returned by
+	#  findAirway(). The waypoint at \p start is not included.
+	#  \param index If given, the airway's position index, from which the legs get their distances.
+	def airwayWaypoints(self, airway, start, end, index = None):
+		if start < end:
+			run = airway['waypoints'][start + 1:end + 1]
 		else:
-			raise ValueError('{0}: Unrecognised navdata type')
-
-		airports = [ ]
-		awySegments = { }
-		f = open(path, 'r', encoding = 'latin_1')
-		i = 0
-		for line in f:
-			i += 1
-			line = line.rstrip('\r\n')
-
-			# Parse the header
-			if i < 4:
-				if line == 1:
-					# Origin code. We don't use this, but check it's valid anyway.
-					if line != 'I' and line != 'A':
-						raise ValueError('{0} invalid. Line {1}: Invalid origin code'.format(path, i))
-				elif line == 2:
-					m = re.match('^([0-9]+) Version', line)
-					if m is None:
-						raise ValueError('{0} invalid. Line {1}: Invalid version string'.format(path, i))
-					if m.group(1) != version:
-						raise ValueError('{0}: Unsupported file format version'.format(path))
-				elif line == 3:
-					if line != '':
-						raise ValueError('{0} invalid. Line {1}: Expected empty line'.format(path, i))
-				continue
-
-			# Parse the data
-			if type == 'nav':
-				m = re.match('^([0-9]+)\s?', line)
-				if m is None:
-					raise ValueError('{0} invalid. Line {1}: Invalid row code'.format(path, i))
-				code = m.group(1)
-
-				if code == '2':
-					# NDB
-					expected = 9
-					tokens = line.split(None, expected - 1)
-					if len(tokens) != expected:
-						raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-					ident = tokens[7]
-					data = dict(
-						type      = 'ndb',
-						coords    = (float(tokens[1]), float(tokens[2])),
-						elevation = int(tokens[3]),
-						freq      = int(tokens[4]),
-						recRange  = int(tokens[5]),
-						code      = ident,
-						name      = tokens[8])
-					if ident in self.navaids:
-						self.navaids[ident].append(data)
-					else:
-						self.navaids[ident] = [ data ]
-
-				elif code == '3':
-					# VOR
-					expected = 9
-					tokens = line.split(None, expected - 1)
-					if len(tokens) != expected:
-						raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-					ident = tokens[7]
-					data = dict(
-						type      = 'vor',
-						coords    = (float(tokens[1]), float(tokens[2])),
-						elevation = int(tokens[3]),
-						freq      = int(tokens[4]),
-						recRange  = int(tokens[5]),
-						sVar      = float(tokens[6]),
-						code      = ident,
-						name      = tokens[8])
-					if ident in self.navaids:
-						self.navaids[ident].append(data)
-					else:
-						self.navaids[ident] = [ data ]
-
-				elif code == '12' or code == '13':
-					# DME
-					expected = 9
-					tokens = line.split(None, expected - 1)
-					if len(tokens) != expected:
-						raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-					ident = tokens[7]
-					data = dict(
-						type      = 'dme',
-						coords    = (float(tokens[1]), float(tokens[2])),
-						elevation = int(tokens[3]),
-						freq      = int(tokens[4]),
-						recRange  = int(tokens[5]),
-						dmeBias   = float(tokens[6]),
-						code      = ident,
-						name      = tokens[8])
-					if ident in self.navaids:
-						self.navaids[ident].append(data)
-					else:
-						self.navaids[ident] = [ data ]
-
-				elif code == '99':
-					# End of file
-					break
-
-				# Not interested in these
-				elif code == '4' or code == '5' or code == '6' or code == '7' or code == '8' or code == '9':
-					pass
-
-				else:
-					raise ValueError('{0} invalid. Line {1}: Unrecognised row code {2}.'.format(path, i, code))
+			run = airway['waypoints'][end:start]
+			run.reverse()
+		if self.stats is not None:
+			self.stats.count('airwayWaypoints', len(run))
+		waypoints = [Leg(waypoint['navaid'], airway, airway) for waypoint in run]
+		waypoints[-1].outAwy = None
+		if index is not None:
+			cumDistance = index.cumDistance
+			step = 1 if start < end else -1
+			for leg, n in zip(waypoints, range(start + step, end + step, step)):
+				leg.distance = abs(cumDistance[n] - cumDistance[n - step])
+		return waypoints
+
+	## Returns the distances along the airways with the given identifier, which are worked out once
+	#  per airway, so that the distance between any two waypoints of an airway is a subtraction.
+	#  \returns A list with an entry for each airway in airways[code], listing the distance from the
+	#  airway's first waypoint to each of its waypoints in nautical miles.
+	def airwayDistances(self, code):
+		return [index.cumDistance for index in self._airwayIndex(code)]
+
+	# Finds the run of an airway between the source navaid and the destination code without copying
+	# it, open at the cruise level if given. Returns the airway, its position index and the positions
+	# of the source and destination, or four Nones.
+	def _findAirwayRun(self, code, src, dest, cruiseLevel = None):
+		if self.airwayCache is not None:
+			key = (code, src['code'], src['coords'], dest, cruiseLevel)
+			run = self.airwayCache.get(key)
+			if self.stats is not None:
+				self.stats.count('airwayCache.misses' if run is None else 'airwayCache.hits')
+			if run is None:
+				run = self._searchAirwayRun(code, src, dest, cruiseLevel)
+				self.airwayCache.put(key, run)
+			return run
+		return self._searchAirwayRun(code, src, dest, cruiseLevel)
+
+	def _searchAirwayRun(self, code, src, dest, cruiseLevel):
+		if code not in self.airways:
+			return None, None, None, None
 
-			elif type == 'fix':
-				# Discard lines we aren't interested in
-				if line == '':
-					continue
-				if line == '99':
-					break
-
-				expected = 3
-				tokens = line.split(None, expected - 1)
-				if len(tokens) != expected:
-					raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-				ident = tokens[2]
-				data = dict(
-					type      = 'fix',
-					coords    = (float(tokens[0]), float(tokens[1])),
-					code      = ident)
-				if ident in self.navaids:
-					self.navaids[ident].append(data)
-				else:
-					self.navaids[ident] = [ data ]
-
-			elif type == 'awy':
-				# Loading airway data is a two step process. First we read the segments into a dict
-				# keyed by the airway identifier, then we run through the segments and join up
-				# segments into actual airways. We can't do this in one step because segments may be
-				# presented in any order, and more than one airway can have the same identifier.
-				expected = 10
-				tokens = line.split(None, expected - 1)
-				if len(tokens) != expected:
-					if len(tokens) == 1 and line == '99':
-						# End of file
-						break
-					raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-				if tokens[6] != '1' and tokens[6] != '2':
-					raise ValueError("{0} invalid. Line {1}: Invalid airway type '{2}.".format(path, i, tokens[6]))
-
-				idents = tokens[9].split('-')
-				data = dict(
-					waypoints = (
-						dict(code = tokens[0], coords = (float(tokens[1]), float(tokens[2]))),
-						dict(code = tokens[3], coords = (float(tokens[4]), float(tokens[5])))),
-					high = tokens[6] == '2',
-					base = int(tokens[7]),
-					top  = int(tokens[8]))
-				for ident in idents:
-					if ident in awySegments:
-						awySegments[ident].append(data.copy())
-					else:
-						awySegments[ident] = [ data.copy() ]
-
-			elif type == 'apt':
-				# The airport data unhelpfully doesn't include the airport reference point, so use
-				# the geographical centre of the airport taking into account runways and helipads
-
-				# Discard lines we aren't interested in
-				if line == '':
-					continue
-				if line == '99':
-					break
-				code = line.split(None, 1)[0]
-				if code != '1' and code != '16' and code != '17' and \
-					code != '100' and code != '102' and code != '103':
+		for airway, index in zip(self.airways[code], self._airwayIndex(code)):
+			if self.stats is not None:
+				self.stats.count('airwayScans')
+			start = index.find(src)
+			if start is None or dest not in index.positions:
+				continue
+			# Take the nearest occurrence of the destination if it appears more than once
+			end = min((position for position in index.positions[dest] if position != start and
+				(cruiseLevel is None or index.levelOpen(start, position, cruiseLevel))),
+				key = lambda position: abs(position - start), default = None)
+			if end is not None:
+				return airway, index, start, end
+
+		return None, None, None, None
+
+	## Returns the navaids where two airways cross.
+	#  \param code Identifier of one airway.
+	#  \param other Identifier of the other airway.
+	#  \returns A sequence of (code, coords) tuples of the navaids on both airways.
+	def airwayIntersections(self, code, other):
+		return self._intersectionIndex().get(code, { }).get(other, ())
+
+	## Returns the legs along an airway from a navaid to where another airway crosses it, for routes
+	#  going straight from one airway onto another. If the airways cross more than once, the crossing
+	#  nearest along the airway from the source is taken.
+	#  \param code Airway identifier.
+	#  \param src Source navaid. This must be on the airway.
+	#  \param other Identifier of the crossing airway.
+	#  \param cruiseLevel As for findAirway().
+	#  \returns A list of legs and the airway as from findAirway(), ending at the crossing; or \c None
+	#  and \c None if the airways don't cross past the source.
+	def findAirwayIntersection(self, code, src, other, cruiseLevel = None):
+		airway, index, start, end = self._findIntersectionRun(code, src, other, cruiseLevel)
+		if airway is None:
+			return None, None
+		return self.airwayWaypoints(airway, start, end, index), airway
+
+	# As _findAirwayRun(), but to the crossing with another airway nearest to the source
+	def _findIntersectionRun(self, code, src, other, cruiseLevel = None):
+		crossings = self.airwayIntersections(code, other)
+		if len(crossings) == 0:
+			return None, None, None, None
+
+		for airway, index in zip(self.airways[code], self._airwayIndex(code)):
+			if self.stats is not None:
+				self.stats.count('airwayScans')
+			start = index.find(src)
+			if start is None:
+				continue
+			ends = (index.find(dict(code = crossing, coords = coords))
+				for crossing, coords in crossings)
+			end = min((position for position in ends if position is not None and position != start and
+				(cruiseLevel is None or index.levelOpen(start, position, cruiseLevel))),
+				key = lambda position: abs(position - start), default = None)
+			if end is not None:
+				return airway, index, start, end
+
+		return None, None, None, None
+
+	## Returns the coordinates of the navaids with the given code in radians, as an array suitable
+	#  for coordsDistanceMany(). The array is computed on first use and kept.
+	def navaidRadians(self, code):
+		if code not in self._navaidRadians:
+			self._navaidRadians[code] = coordsRadians(
+				[navaid['coords'] for navaid in self.navaids[code]])
+		return self._navaidRadians[code]
+
+	## Returns the navaids with the given code sorted by distance from a point, nearest first.
+	#  \param code Navaid code.
+	#  \param standpoint Standpoint tuple (lat, lon).
+	def nearestNavaids(self, code, standpoint):
+		navaids = self.navaids[code]
+		if len(navaids) < 2:
+			return list(navaids)
+		distances = coordsDistanceMany(standpoint, self.navaidRadians(code), inRadians = True)
+		return [navaids[n] for n in argsortDistances(distances)]
+
+	## Returns the navaids nearest to a point.
+	#  \param coords Point tuple (lat, lon).
+	#  \param k Maximum number of navaids to return.
+	#  \param types If not \c None, only navaids of these types ('fix', 'vor', 'ndb', 'dme' or 'apt')
+	#  are returned.
+	#  \returns A list of (distance, navaid) tuples, nearest first. Distances are in nautical miles.
+	def nearest(self, coords, k = 1, types = None):
+		return self._spatialGrid().nearest(coords, k, types)
+
+	## Returns the navaids within a radius of a point.
+	#  \param coords Centre tuple (lat, lon).
+	#  \param radius Radius in nautical miles.
+	#  \param types If not \c None, only navaids of these types are returned.
+	#  \returns A list of (distance, navaid) tuples, nearest first.
+	def within(self, coords, radius, types = None):
+		return self._spatialGrid().within(coords, radius, types)
+
+	## Suggests navaids for a code which may be mistyped or incomplete: those whose codes start with
+	#  it or are within an edit of it (a character changed, added, removed, or two swapped), or within
+	#  two edits if there are none within one; see IdentIndex.similar(). The index of codes is built
+	#  when the navdata is parsed, or on first use for compact navdata.
+	#  \param code Navaid code. Navaids with this code are not suggested.
+	#  \param coords If given, the navaids nearest this point come first; otherwise those fewest
+	#  edits away.
+	#  \param limit Maximum number of navaids to suggest.
+	#  \returns A list of navaids.
+	def suggestNavaids(self, code, coords = None, limit = 10):
+		index = self._identIndex()
+		similar = index.similar(code, 1)
+		if len(similar) == 0:
+			similar = index.similar(code, 2)
+		edits = dict((ident, n) for n, ident in similar)
+		for ident in index.prefixed(code):
+			if ident != code:
+				edits.setdefault(ident, len(ident) - len(code))
+
+		navaids = [navaid for ident in edits for navaid in self.navaids.get(ident, ())]
+		if coords is not None:
+			navaids.sort(key = lambda navaid: coordsDistance(coords, navaid['coords']))
+		else:
+			navaids.sort(key = lambda navaid: (edits[navaid['code']], navaid['code']))
+		return navaids[:limit]
+
+	## Returns the graph of the airway network used for autorouting. It is built on first use and
+	#  kept.
+	def airwayGraph(self):
+		if self._graph is None:
+			# Imported here as autoroute depends on this module
+			from autoroute import AirwayGraph
+			self._graph = AirwayGraph(self.airways)
+		return self._graph
+
+	# Returns the index of airway crossings, building it if needed: airway identifier -> identifier of
+	# a crossing airway -> list of (code, coords) of the navaids they share
+	def _intersectionIndex(self):
+		if self._intersections is None:
+			# Airway identifiers through each navaid
+			through = { }
+			for code, airways in self.airways.items():
+				for airway in airways:
+					for waypoint in airway['waypoints']:
+						navaid = waypoint['navaid']
+						through.setdefault((navaid['code'], tuple(navaid['coords'])), set()).add(code)
+
+			self._intersections = { }
+			for key, codes in through.items():
+				if len(codes) < 2:
 					continue
-
-				if code == '1' or code == '16' or code == '17':
-					# Airport header
-					expected = 6
-					tokens = line.split(None, expected - 1)
-					if len(tokens) != expected:
-						raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-					airports.append(dict(
-						coords    = [ ],
-						elevation = int(tokens[1]),
-						code      = tokens[4],
-						name      = tokens[5]))
-
-				else:
-					if len(airports) == 0:
-						raise ValueError('{0} invalid. Line {1}: Runway before airport header.'.format(path, i))
-
-					if code == '100':
-						# Land runway
-						expected = 26
-						tokens = line.split(None, expected - 1)
-						if len(tokens) != expected:
-							raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-						airports[-1]['coords'] += [
-							(float(tokens[9]), float(tokens[10])),
-							(float(tokens[18]), float(tokens[19])) ]
-
-					elif code == '101':
-						# Water runway
-						expected = 9
-						tokens = line.split(None, expected - 1)
-						if len(tokens) != expected:
-							raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-						airports[-1]['coords'] += [
-							(float(tokens[4]), float(tokens[5])),
-							(float(tokens[7]), float(tokens[8])) ]
-
-					elif code == '103':
-						# Helipad
-						expected = 12
-						tokens = line.split(None, expected - 1)
-						if len(tokens) != expected:
-							raise ValueError('{0} invalid. Line {1}: Incorrect number of tokens. Got {2}; expected {3}.'.format(path, i, len(tokens), expected))
-
-						airports[-1]['coords'].append((float(tokens[2]), float(tokens[3])))
-
+				for code in codes:
+					crossings = self._intersections.setdefault(code, { })
+					for other in codes:
+						if other != code:
+							crossings.setdefault(other, [ ]).append(key)
+		return self._intersections
+
+	# Returns the spatial index of the navaids, building it if needed
+	def _spatialGrid(self):
+		if self._grid is None:
+			if self._tables is not None:
+				navaids = self._tables.allNavaids()
+			else:
+				navaids = (navaid for navaids in self.navaids.values() for navaid in navaids)
+			self._grid = SpatialGrid(navaids)
+		return self._grid
+
+	# Returns the index of navaid codes, building it if needed
+	def _identIndex(self):
+		if self._idents is None:
+			if isinstance(self.navaids, LazyNavaids):
+				# Without parsing the airports
+				self._idents = IdentIndex(self.navaids.codes())
+			else:
+				self._idents = IdentIndex(self.navaids)
+		return self._idents
+
+	# Returns the position indexes of the airways with the given identifier, building them if needed
+	def _airwayIndex(self, code):
+		if code not in self._airwayIndexes:
+			self._airwayIndexes[code] = [_AirwayIndex(airway) for airway in self.airways[code]]
+		return self._airwayIndexes[code]
+
+	# Builds the position indexes of every airway. The leg distances of all the airways are worked
+	# out in one go, as that is much quicker than airway by airway.
+	def _buildAirwayIndexes(self):
+		indexes = [ ]
+		for code, airways in self.airways.items():
+			self._airwayIndexes[code] = [_AirwayIndex(airway, False) for airway in airways]
+			indexes += self._airwayIndexes[code]
+		# This includes distances from the end of each airway to the start of the next, skipped below
+		distances = pathDistances([coords for index in indexes for coords in index._coords])
+		n = 0
+		for index in indexes:
+			length = len(index._coords)
+			index.measure(distances[n:n + length - 1])
+			n += length
+
+	## Enables caching of parsed routes and airway lookups, which helps when the same routes are
+	#  parsed repeatedly. The caches are emptied whenever the navdata changes.
+	#  \param routes Maximum number of parsed routes to keep.
+	#  \param airways Maximum number of airway lookups to keep.
+	def enableCache(self, routes = 1024, airways = 4096):
+		self.routeCache = LruCache(routes)
+		self.airwayCache = LruCache(airways)
+
+	## Disables caching of parsed routes and airway lookups.
+	def disableCache(self):
+		self.routeCache = None
+		self.airwayCache = None
+
+	## Returns the hit and miss counts of the route and airway caches, or \c None if caching is not
+	#  enabled.
+	def cacheStats(self):
+		if self.routeCache is None:
+			return None
+		return dict(routes = self.routeCache.stats(), airways = self.airwayCache.stats())
+
+	## Starts recording timers and counters of the work done; see the stats module. The stats are
+	#  shared by the routes parsed with this navdata.
+	#  \returns The Stats object, which is also kept in \c stats.
+	def enableStats(self):
+		if self.stats is None:
+			self.stats = Stats()
+		return self.stats
+
+	## Stops recording timers and counters.
+	def disableStats(self):
+		self.stats = None
+
+	# Resets the indexes derived from the navaids and airways, and empties the caches
+	def _initIndexes(self):
+		self._airwayIndexes = { }
+		self._navaidRadians = { }
+		self._grid = None
+		self._idents = None
+		self._graph = None
+		self._intersections = None
+		if self.routeCache is not None:
+			self.routeCache.clear()
+			self.airwayCache.clear()
+
+	# Stores the records parsed from a navdata file
+	def _addRecords(self, type, records):
+		start = time.perf_counter()
 		if type == 'awy':
-			# Join airway segments into airways
-			for ident, segments in awySegments.items():
-				while len(segments) != 0:
-					# Fill the airway structure
-					airway = dict(
-						code      = ident,
-						high      = segments[0]['high'],
-						waypoints = [
-							dict(
-								base   = segments[0]['base'],
-								top    = segments[0]['top'],
-								navaid = segments[0]['waypoints'][0]),
-							dict(
-								base   = None,
-								top    = None,
-								navaid = segments[0]['waypoints'][1])])
-					del segments[0]
-
-					while True:
-						found = False
-						i = 0
-						for segment in segments:
-							if segment['high'] == airway['high'] and \
-							  (segment['waypoints'][0] == airway['waypoints'][-1]['navaid'] or \
-							   segment['waypoints'][1] == airway['waypoints'][-1]['navaid']):
-								found = True
-
-								# Flip the source and destination around if necessary
-								if segment['waypoints'][1] == airway['waypoints'][-1]['navaid']:
-									waypoint = segment['waypoints'][0]
-								else:
-									waypoint = segment['waypoints'][1]
-
-								airway['waypoints'][-1]['base'] = segment['base']
-								airway['waypoints'][-1]['top']  = segment['top']
-								airway['waypoints'].append(dict(
-									base   = None,
-									top    = None,
-									navaid = waypoint))
-
-								del segments[i]
-								break
-							i += 1
-
-						if not found:
-							# End of airway; continue in the other direction
-							i = 0
-							for segment in segments:
-								if segment['high'] == airway['high'] and \
-								  (segment['waypoints'][0] == airway['waypoints'][0]['navaid'] or \
-								   segment['waypoints'][1] == airway['waypoints'][0]['navaid']):
-									found = True
-
-									if segment['waypoints'][0] == airway['waypoints'][0]['navaid']:
-										waypoint = segment['waypoints'][1]
-									else:
-										waypoint = segment['waypoints'][0]
-
-									airway['waypoints'].insert(0, dict(
-										base   = segment['base'],
-										top    = segment['top'],
-										navaid = waypoint))
-
-									del segments[i]
-									break
-								i += 1
-							if not found:
-								# Got all the waypoints
-								break
-
-					if ident in self.airways:
-						self.airways[ident].append(airway)
-					else:
-						self.airways[ident] = [ airway ]
-
-		elif type == 'apt':
-			# Average coordinates
-			for airport in airports:
-				if len(airport['coords']) == 0:
-					continue
-				coords = [0, 0]
-				for point in airport['coords']:
-					coords[0] += point[0]
-					coords[1] += point[1]
-				coords[0] /= len(airport['coords'])
-				coords[1] /= len(airport['coords'])
-				airport['coords'] = tuple(coords)
-
-				if airport['code'] in self.navaids:
-					self.navaids[airport['code']].append(airport)
+			# Loading airway data is a two step process. First we read the segments into a dict
+			# keyed by the airway identifier, then we run through the segments and join up segments
+			# into actual airways. We can't do this in one step because segments may be presented in
+			# any order, and more than one airway can have the same identifier.
+			for ident, segments in _groupSegments(records).items():
+				self.airways[ident] = assembleAirways(ident, segments)
+
+		else:
+			for data in records:
+				if data['code'] in self.navaids:
+					self.navaids[data['code']].append(data)
 				else:
-					self.navaids[airport['code']] = [ airport ]
+					self.navaids[data['code']] = [ data ]
+
+		if self.stats is not None:
+			self.stats.time('load.assembly' if type == 'awy' else 'load.store',
+				time.perf_counter() - start)
+
+# Groups the records parsed from awy.dat into lists of segments by airway identifier
+def _groupSegments(records):
+	awySegments = { }
+	for idents, data in records:
+		for ident in idents:
+			if ident in awySegments:
+				awySegments[ident].append(data.copy())
+			else:
+				awySegments[ident] = [ data.copy() ]
+	return awySegments
+
+# Key identifying an airway segment whichever way round it is, so that the segments of assembled
+# airways can be compared with those read from awy.dat
+def _segmentKey(a, b, high, base, top):
+	a, b = (a['code'], tuple(a['coords'])), (b['code'], tuple(b['coords']))
+	return (min(a, b), max(a, b), high, base, top)
+
+# Counts the segments of assembled airways. Each waypoint holds the base and top of the segment to
+# the next.
+def _airwaySegments(airways):
+	segments = Counter()
+	for airway in airways:
+		waypoints = airway['waypoints']
+		for n in range(len(waypoints) - 1):
+			segments[_segmentKey(waypoints[n]['navaid'], waypoints[n + 1]['navaid'], airway['high'],
+				waypoints[n]['base'], waypoints[n]['top'])] += 1
+	return segments
+
+# Counts the segments read from awy.dat
+def _fileSegments(segments):
+	return Counter(_segmentKey(segment['waypoints'][0], segment['waypoints'][1], segment['high'],
+		segment['base'], segment['top']) for segment in segments)
+
+# Compares old and new records code by code, returning the added, removed and modified codes
+def _diff(old, new, same):
+	return dict(
+		added    = [code for code in new if code not in old],
+		removed  = [code for code in old if code not in new],
+		modified = [code for code in new if code in old and not same(old[code], new[code])])
+
+# Copies an airway read from compact tables into dicts
+def _airwayDict(airway):
+	return dict(code = airway['code'], high = airway['high'], waypoints = [
+		dict(base = waypoint['base'], top = waypoint['top'], navaid = waypoint['navaid'].copy())
+		for waypoint in airway['waypoints']])
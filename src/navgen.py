@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import argparse
+import os
+import random
+from math import *
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+## Writes a synthetic navdata set in the X-Plane formats read by NavData: earth_fix.dat,
+#  earth_nav.dat, earth_awy.dat and apt.dat. The same parameters always give the same files.
+#  \param path Directory to write the files to. It is created if needed.
+#  \param fixes Number of fixes.
+#  \param duplicates Fraction of fixes and navaids given an ident already in use elsewhere.
+#  \param navaids Number of VORs, NDBs and DMEs.
+#  \param airways Number of airways.
+#  \param airwayLength Range of the number of segments in an airway, as a (min, max) tuple.
+#  \param airports Number of airports.
+#  \param seed Random seed.
+def generate(path, fixes = 20000, duplicates = 0.05, navaids = 2000, airways = 500,
+	airwayLength = (5, 40), airports = 2000, seed = 0):
+	rand = random.Random(seed)
+	os.makedirs(path, exist_ok = True)
+	idents = _Idents(rand, duplicates)
+
+	# Airway fixes come first, so that airways join up at shared fixes; the rest are scattered
+	fixRecords = [ ]
+	segments = [ ]
+	for n in range(airways):
+		length = rand.randint(*airwayLength)
+		if len(fixRecords) + length + 1 > fixes:
+			break
+		segments += _airway(rand, idents, fixRecords, length)
+	while len(fixRecords) < fixes:
+		fixRecords.append((_lat(rand), _lon(rand), idents.new(5)))
+	rand.shuffle(segments)
+
+	_writeFixes(path, fixRecords)
+
+	with open(os.path.join(path, 'earth_nav.dat'), 'w') as f:
+		f.write('I\n810 Version - synthetic\n\n')
+		for n in range(navaids):
+			lat, lon, ident = _lat(rand), _lon(rand), idents.new(3)
+			kind = rand.choice(('ndb', 'vor', 'dme', 'ils'))
+			if kind == 'ndb':
+				f.write('2 {0:.6f} {1:.6f} {2} {3} 50 0.0 {4} {4} NDB\n'.format(lat, lon,
+					rand.randint(0, 3000), rand.randint(190, 535), ident))
+			elif kind == 'vor':
+				f.write('3 {0:.6f} {1:.6f} {2} {3} 130 {4:.1f} {5} {5} VOR/DME\n'.format(lat, lon,
+					rand.randint(0, 3000), rand.randint(10800, 11795), rand.uniform(-20, 20), ident))
+			elif kind == 'dme':
+				f.write('12 {0:.6f} {1:.6f} {2} {3} 130 0.000 {4} {4} VOR/DME\n'.format(lat, lon,
+					rand.randint(0, 3000), rand.randint(10800, 11795), ident))
+			else:
+				# Skipped when parsed, as in the real data
+				f.write('4 {0:.6f} {1:.6f} {2} 11030 18 90.000 I{3} KXXX 09 ILS-cat-I\n'.format(
+					lat, lon, rand.randint(0, 3000), ident))
+		f.write('99\n')
+
+	_writeAirways(path, segments)
+
+	with open(os.path.join(path, 'apt.dat'), 'w') as f:
+		f.write('I\n850 Version - synthetic\n\n')
+		for n in range(airports):
+			lat, lon = _lat(rand), _lon(rand)
+			f.write('1 {0} 0 0 {1} Synthetic Airport {2}\n'.format(rand.randint(0, 9000),
+				idents.new(4), n))
+			f.write('1302 city Synthetic\n')
+			for runway in range(rand.randint(1, 3)):
+				heading = rand.uniform(0, pi)
+				dlat, dlon = 0.015 * cos(heading), 0.015 * sin(heading) / cos(radians(lat))
+				f.write('100 45.00 1 0 0.25 1 2 1 {0:02d} {1:.8f} {2:.8f} 0 0 3 0 1 0 {3:02d} '
+					'{4:.8f} {5:.8f} 0 0 3 0 1 0\n'.format(runway * 2 + 1, lat - dlat, lon - dlon,
+					runway * 2 + 2, lat + dlat, lon + dlon))
+			# Pavement and taxi route rows, which make up most of a real apt.dat but aren't used
+			f.write('110 2 0.25 0.00 Taxiway\n')
+			nodes = rand.randint(4, 60)
+			for node in range(nodes):
+				f.write('{0} {1:.8f} {2:.8f}\n'.format(113 if node == nodes - 1 else 111,
+					lat + rand.uniform(-0.01, 0.01), lon + rand.uniform(-0.01, 0.01)))
+			f.write('1200\n')
+			for node in range(nodes):
+				f.write('1201 {0:.8f} {1:.8f} both {2} Node\n'.format(
+					lat + rand.uniform(-0.01, 0.01), lon + rand.uniform(-0.01, 0.01), node))
+			for node in range(nodes - 1):
+				f.write('1202 {0} {1} twoway taxiway A\n'.format(node, node + 1))
+			f.write('\n')
+		f.write('99\n')
+
+## Writes a navdata set holding only the given fixes and airways, with no other navaids or airports,
+#  for small hand-made sets.
+#  \param path Directory to write the files to. It is created if needed.
+#  \param fixes List of (lat, lon, ident) tuples.
+#  \param segments List of airway segments, each a ((fix, fix), high, base, top, ident) tuple where
+#  the fixes are (lat, lon, ident) tuples and the ident may join several airway identifiers with
+#  hyphens.
+def write(path, fixes, segments):
+	os.makedirs(path, exist_ok = True)
+	_writeFixes(path, fixes)
+	_writeAirways(path, segments)
+	with open(os.path.join(path, 'earth_nav.dat'), 'w') as f:
+		f.write('I\n810 Version - synthetic\n\n99\n')
+	with open(os.path.join(path, 'apt.dat'), 'w') as f:
+		f.write('I\n850 Version - synthetic\n\n99\n')
+
+def _writeFixes(path, fixes):
+	with open(os.path.join(path, 'earth_fix.dat'), 'w') as f:
+		f.write('I\n600 Version - synthetic\n\n')
+		for lat, lon, ident in fixes:
+			f.write('{0:11.6f} {1:11.6f} {2}\n'.format(lat, lon, ident))
+		f.write('99\n')
+
+def _writeAirways(path, segments):
+	with open(os.path.join(path, 'earth_awy.dat'), 'w') as f:
+		f.write('I\n640 Version - synthetic\n\n')
+		for (a, b), high, base, top, ident in segments:
+			f.write('{0} {1:.6f} {2:.6f} {3} {4:.6f} {5:.6f} {6} {7} {8} {9}\n'.format(
+				a[2], a[0], a[1], b[2], b[0], b[1], 2 if high else 1, base, top, ident))
+		f.write('99\n')
+
+def _lat(rand):
+	return rand.uniform(-60, 72)
+
+def _lon(rand):
+	return rand.uniform(-180, 180)
+
+# Builds an airway as a series of fixes along a track, starting at an existing airway fix half of
+# the time so that airways cross. New fixes are added to the list. Returns the segments.
+def _airway(rand, idents, fixRecords, length):
+	if len(fixRecords) != 0 and rand.random() < 0.5:
+		fix = rand.choice(fixRecords)
+	else:
+		fix = (_lat(rand), _lon(rand), idents.new(5))
+		fixRecords.append(fix)
+	ident = rand.choice('ABGJLMNRUVW') + str(rand.randint(1, 999))
+	if rand.random() < 0.1:
+		# Airway with two designators
+		ident += '-' + rand.choice('ABGJLMNRUVW') + str(rand.randint(1, 999))
+	high = rand.random() < 0.5
+	base, top = (180, 460) if high else (rand.choice((10, 30, 50)), 180)
+
+	heading = rand.uniform(0, 2 * pi)
+	segments = [ ]
+	for n in range(length):
+		heading += rand.uniform(-0.3, 0.3)
+		step = rand.uniform(0.3, 1.2)
+		lat = min(max(fix[0] + step * cos(heading), -80), 80)
+		lon = (fix[1] + step * sin(heading) / max(cos(radians(lat)), 0.2) + 540) % 360 - 180
+		following = (round(lat, 6), round(lon, 6), idents.new(5))
+		fixRecords.append(following)
+		# Segments are listed either way round
+		ends = (fix, following) if rand.random() < 0.5 else (following, fix)
+		segments.append((ends, high, base, top, ident))
+		fix = following
+	return segments
+
+# Hands out idents, reusing one already handed out at the given rate
+class _Idents:
+	def __init__(self, rand, duplicates):
+		self._rand = rand
+		self._duplicates = duplicates
+		self._used = { }
+
+	def new(self, length):
+		used = self._used.setdefault(length, [ ])
+		if len(used) != 0 and self._rand.random() < self._duplicates:
+			return self._rand.choice(used)
+		ident = ''.join(self._rand.choice(LETTERS) for n in range(length))
+		used.append(ident)
+		return ident
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Writes a synthetic X-Plane navdata set.')
+	parser.add_argument('path', help = 'directory to write the files to')
+	parser.add_argument('--fixes', type = int, default = 20000)
+	parser.add_argument('--duplicates', type = float, default = 0.05,
+		help = 'fraction of idents used more than once')
+	parser.add_argument('--navaids', type = int, default = 2000)
+	parser.add_argument('--airways', type = int, default = 500)
+	parser.add_argument('--airway-length', type = int, nargs = 2, default = (5, 40),
+		metavar = ('MIN', 'MAX'), help = 'range of the number of segments in an airway')
+	parser.add_argument('--airports', type = int, default = 2000)
+	parser.add_argument('--seed', type = int, default = 0)
+	args = parser.parse_args()
+	generate(args.path, args.fixes, args.duplicates, args.navaids, args.airways,
+		tuple(args.airway_length), args.airports, args.seed)
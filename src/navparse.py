@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import gc
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import accumulate
+
+## Size of the chunks large files are split into for parallel parsing, in bytes.
+CHUNK_SIZE = 16 << 20
+
+## Size of the chunks files are parsed in one after another when not parsing in parallel, in bytes.
+#  Only one chunk of the file is held in memory at a time.
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Raised while parsing a chunk; the line number is relative to the start of the chunk
+class _ParseError(Exception):
+	def __init__(self, line, message):
+		Exception.__init__(self, message)
+		self.line = line
+
+## Returns the type of a navdata file ('awy', 'fix', 'nav' or 'apt') and its supported version.
+def fileType(path):
+	if path.endswith('awy.dat'):
+		return 'awy', '640'
+	elif path.endswith('fix.dat'):
+		return 'fix', '600'
+	elif path.endswith('nav.dat'):
+		return 'nav', '810'
+	elif path.endswith('apt.dat'):
+		return 'apt', '850'
+	else:
+		raise ValueError('{0}: Unrecognised navdata type'.format(path))
+
+## Returns \c True if the given apt.dat line is an airport header row.
+def isAirportHeader(line):
+	return line.split(None, 1)[:1] in ([b'1'], [b'16'], [b'17'])
+
+## Splits a navdata file into byte ranges for parsing separately. Ranges start at the beginning of a
+#  line and, for apt.dat, at an airport header row so that each airport lies within one range.
+#  \param path Path to the file.
+#  \param chunkSize Approximate size of each range.
+#  \returns A list of (start, end) tuples covering the whole file.
+def chunkFile(path, chunkSize = CHUNK_SIZE):
+	type, version = fileType(path)
+	size = os.path.getsize(path)
+	starts = [0]
+	with open(path, 'rb') as f:
+		# Skip the header
+		for n in range(3):
+			f.readline()
+		headerEnd = f.tell()
+
+		target = chunkSize
+		while target < size:
+			f.seek(max(target, headerEnd))
+			f.readline()
+			while True:
+				start = f.tell()
+				line = f.readline()
+				if line == b'' or type != 'apt' or isAirportHeader(line):
+					break
+			if start >= size:
+				break
+			if start > starts[-1]:
+				starts.append(start)
+			target = start + chunkSize
+	return list(zip(starts, starts[1:] + [size]))
+
+## Parses a byte range of a navdata file.
+#  \param path Path to the file.
+#  \param start Offset of the first line to parse. The file header is expected if this is zero.
+#  \param end Offset to stop at, or \c None to parse to the end of the file.
+#  \returns The file type, a list of records and whether the end of file row was reached. The
+#  records are navaid dicts for fix.dat, nav.dat and apt.dat, and (idents, segment) tuples for
+#  awy.dat.
+def parseChunk(path, start = 0, end = None):
+	type, version = fileType(path)
+	with open(path, 'rb') as f:
+		f.seek(start)
+		data = f.read() if end is None else f.read(end - start)
+	if b'\r' in data:
+		data = data.replace(b'\r\n', b'\n').rstrip(b'\r')
+
+	headerLines = 0
+	try:
+		with _collectionPaused():
+			if start == 0:
+				lines = data.split(b'\n', 3)
+				_checkHeader(path, version, lines[:3])
+				data = lines[3] if len(lines) > 3 else b''
+				del lines
+				headerLines = 3
+			records, finished = _PARSERS[type](data)
+	except _ParseError as e:
+		# Work out the line number in the file
+		with open(path, 'rb') as f:
+			line = e.line + headerLines + f.read(start).count(b'\n')
+		raise ValueError('{0} invalid. Line {1}: {2}'.format(path, line, e))
+	return type, records, finished
+
+## Parses the given navdata files, in parallel if requested.
+#  \param files Paths of the files.
+#  \param workers Number of worker processes, or \c None to parse in this process a chunk of
+#  STREAM_CHUNK_SIZE at a time.
+#  \param chunkSize Approximate size of the chunks large files are split into for the workers.
+#  \returns A generator yielding the file type and the records of each file, in the order of
+#  \p files.
+def parseFiles(files, workers = None, chunkSize = CHUNK_SIZE):
+	if workers is None or workers < 2:
+		for path in files:
+			records = [ ]
+			for start, end in chunkFile(path, STREAM_CHUNK_SIZE):
+				type, chunkRecords, finished = parseChunk(path, start, end)
+				records += chunkRecords
+				if finished:
+					break
+			yield path, type, records
+		return
+
+	with ProcessPoolExecutor(workers) as executor:
+		# Submit every chunk of every file up front so the files are parsed concurrently. The
+		# workers send back their records packed into columns, which are far quicker to pass
+		# between processes than the records themselves.
+		futures = [ ]
+		for path in files:
+			futures.append([executor.submit(_parseChunkPacked, path, start, end)
+				for start, end in chunkFile(path, chunkSize)])
+		for path, chunks in zip(files, futures):
+			records = [ ]
+			for future in chunks:
+				type, packed, finished = future.result()
+				with _collectionPaused():
+					records += _PACKERS[type][1](*packed)
+				if finished:
+					break
+			for future in chunks:
+				future.cancel()
+			yield path, type, records
+
+# Collection can't free anything while records are built, but it would be triggered over and over by
+# the number of objects allocated
+@contextmanager
+def _collectionPaused():
+	collecting = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if collecting:
+			gc.enable()
+
+# Parses a byte range of a navdata file in a worker process, returning the records packed
+def _parseChunkPacked(path, start, end):
+	type, records, finished = parseChunk(path, start, end)
+	return type, _PACKERS[type][0](records), finished
+
+# Joins strings into one for packing; none of those packed can contain a newline, since they are
+# read from within a line
+def _joinStrings(strings):
+	return '\n'.join(strings)
+
+def _splitStrings(strings, count):
+	return strings.split('\n') if count > 0 else [ ]
+
+# Packers turn the records parsed from a chunk into a tuple of a count, arrays and strings, and
+# unpackers turn such a tuple back into the records
+
+def _packFix(records):
+	return (len(records),
+		array('d', [record['coords'][0] for record in records]),
+		array('d', [record['coords'][1] for record in records]),
+		_joinStrings(record['code'] for record in records))
+
+def _unpackFix(count, lats, lons, codes):
+	return [dict(
+		type   = 'fix',
+		coords = coords,
+		code   = code) for coords, code in zip(zip(lats, lons), _splitStrings(codes, count))]
+
+# nav.dat records have one float field besides the coordinates, depending on their type
+_NAV_FLOATS = dict(ndb = None, vor = 'sVar', dme = 'dmeBias')
+
+def _packNav(records):
+	return (len(records),
+		_joinStrings(record['type'] for record in records),
+		array('d', [record['coords'][0] for record in records]),
+		array('d', [record['coords'][1] for record in records]),
+		array('q', [record['elevation'] for record in records]),
+		array('q', [record['freq'] for record in records]),
+		array('q', [record['recRange'] for record in records]),
+		array('d', [record.get(_NAV_FLOATS[record['type']], 0.0) for record in records]),
+		_joinStrings(record['code'] for record in records),
+		_joinStrings(record['name'] for record in records))
+
+def _unpackNav(count, types, lats, lons, elevations, freqs, recRanges, floats, codes, names):
+	records = [ ]
+	for type, lat, lon, elevation, freq, recRange, value, code, name in zip(
+		_splitStrings(types, count), lats, lons, elevations, freqs, recRanges, floats,
+		_splitStrings(codes, count), _splitStrings(names, count)):
+		record = dict(
+			type      = type,
+			coords    = (lat, lon),
+			elevation = elevation,
+			freq      = freq,
+			recRange  = recRange)
+		if _NAV_FLOATS[type] is not None:
+			record[_NAV_FLOATS[type]] = value
+		record['code'] = code
+		record['name'] = name
+		records.append(record)
+	return records
+
+def _packAwy(records):
+	columns = [[ ] for n in range(10)]
+	for idents, segment in records:
+		a, b = segment['waypoints']
+		for column, value in zip(columns, ('-'.join(idents), a['code'], a['coords'][0],
+			a['coords'][1], b['code'], b['coords'][0], b['coords'][1], segment['high'],
+			segment['base'], segment['top'])):
+			column.append(value)
+	return (len(records), _joinStrings(columns[0]), _joinStrings(columns[1]), array('d', columns[2]),
+		array('d', columns[3]), _joinStrings(columns[4]), array('d', columns[5]),
+		array('d', columns[6]), bytes(columns[7]), array('q', columns[8]), array('q', columns[9]))
+
+def _unpackAwy(count, idents, codesA, latsA, lonsA, codesB, latsB, lonsB, highs, bases, tops):
+	return [(segmentIdents.split('-'), dict(
+		waypoints = (
+			dict(code = codeA, coords = (latA, lonA)),
+			dict(code = codeB, coords = (latB, lonB))),
+		high = high == 1,
+		base = base,
+		top  = top)) for segmentIdents, codeA, latA, lonA, codeB, latB, lonB, high, base, top in zip(
+			_splitStrings(idents, count), _splitStrings(codesA, count), latsA, lonsA,
+			_splitStrings(codesB, count), latsB, lonsB, highs, bases, tops)]
+
+def _packApt(records):
+	return (len(records),
+		array('d', [record['coords'][0] for record in records]),
+		array('d', [record['coords'][1] for record in records]),
+		array('q', [record['elevation'] for record in records]),
+		_joinStrings(record['code'] for record in records),
+		_joinStrings(record['name'] for record in records))
+
+def _unpackApt(count, lats, lons, elevations, codes, names):
+	return [dict(
+		coords    = coords,
+		elevation = elevation,
+		code      = code,
+		name      = name) for coords, elevation, code, name in zip(zip(lats, lons), elevations,
+			_splitStrings(codes, count), _splitStrings(names, count))]
+
+# Checks the three header lines of a file: the origin code, the version and a blank line
+def _checkHeader(path, version, lines):
+	if len(lines) < 1 or (lines[0] != b'I' and lines[0] != b'A'):
+		raise _ParseError(1, 'Invalid origin code')
+	m = re.match(rb'^([0-9]+) Version', lines[1] if len(lines) > 1 else b'')
+	if m is None:
+		raise _ParseError(2, 'Invalid version string')
+	if m.group(1).decode('ascii') != version:
+		raise ValueError('{0}: Unsupported file format version'.format(path))
+	if len(lines) > 2 and lines[2] != b'':
+		raise _ParseError(3, 'Expected empty line')
+
+def _tokenError(n, tokens, expected):
+	return _ParseError(n + 1, 'Incorrect number of tokens. Got {0}; expected {1}.'.format(
+		len(tokens), expected))
+
+# The parsers below take the data of a chunk following the file header and return its records and
+# whether the end of file row was reached. Each row is split once, and rows are only looked at one
+# by one again to report an error.
+
+# Returns the offset of the end of file row in the data, or None if there isn't one
+def _endOffset(data):
+	if data.startswith(b'99\n') or data == b'99':
+		return 0
+	end = data.find(b'\n99\n')
+	if end == -1 and data.endswith(b'\n99'):
+		end = len(data) - 3
+	return None if end == -1 else end + 1
+
+# Splits data into lines
+def _lines(data):
+	lines = data.split(b'\n')
+	if lines[-1] == b'':
+		lines.pop()
+	return lines
+
+# Raises an error for the first row without the expected number of tokens, if there is one
+def _checkTokens(rows, expected, allowed = ()):
+	if set(map(len, rows)).difference((expected, ) + allowed):
+		for n, tokens in enumerate(rows):
+			if len(tokens) != expected and len(tokens) not in allowed:
+				raise _tokenError(n, tokens, expected)
+
+# Splits the rows of a file with a fixed number of columns into columns, and converts the numeric
+# columns. All of the columns are used, so once every row is known to have the right number of
+# tokens the data is split into tokens in one go, and each column is a slice of those. Otherwise the
+# lines are split one by one to find the bad row.
+#  \param types Type of each column, or None to leave it as a string.
+#  \param blanks Whether blank lines are allowed.
+def _columns(data, types, blanks = False):
+	text = data.decode('latin_1')
+	count = len(types)
+	lines = text.split('\n')
+	if lines[-1] == '':
+		lines.pop()
+	if set(map(len, map(str.split, lines))).issubset((count, 0) if blanks else (count, )):
+		del lines
+		tokens = text.split()
+		columns = [tokens[n::count] for n in range(count)]
+		del tokens
+	else:
+		columns = _splitRows(text, count, blanks)
+	return [column if type is None else list(map(type, column))
+		for type, column in zip(types, columns)]
+
+# Splits the lines of a file with a fixed number of columns one by one, raising an error for a row
+# with the wrong number of tokens. Returns the columns.
+def _splitRows(text, count, blanks):
+	# The last column may contain spaces
+	rows = [line.split(None, count - 1) for line in text.split('\n')]
+	if rows[-1] == [ ]:
+		rows.pop()
+	_checkTokens(rows, count, (0, ) if blanks else ())
+	return list(zip(*[tokens for tokens in rows if tokens])) or [[ ]] * count
+
+def _parseFix(data):
+	end = _endOffset(data)
+	lats, lons, codes = _columns(data[:end], (float, float, None), blanks = True)
+	return [dict(
+		type   = 'fix',
+		coords = coords,
+		code   = code) for coords, code in zip(zip(lats, lons), codes)], end is not None
+
+# nav.dat row code -> navaid type for the rows used; the other row codes are for localisers,
+# glideslopes and marker beacons, which are skipped
+_NAV_TYPES = {b'2': 'ndb', b'3': 'vor', b'12': 'dme', b'13': 'dme'}
+_NAV_CODES = set(_NAV_TYPES).union((b'4', b'5', b'6', b'7', b'8', b'9'))
+
+# The rows of nav.dat have different numbers of columns and names can contain spaces, so the lines
+# are split separately. Only the codes and names of the navaids kept are decoded.
+def _parseNav(data):
+	rows = [line.split(None, 8) for line in _lines(data)]
+	rowCodes = [tokens[0] if tokens else b'' for tokens in rows]
+	try:
+		end = rowCodes.index(b'99')
+	except ValueError:
+		end = None
+	else:
+		del rows[end:], rowCodes[end:]
+
+	if not _NAV_CODES.issuperset(rowCodes):
+		for n, rowCode in enumerate(rowCodes):
+			if rowCode not in _NAV_CODES:
+				if not rowCode.isdigit():
+					raise _ParseError(n + 1, 'Invalid row code')
+				raise _ParseError(n + 1, 'Unrecognised row code {0}.'.format(rowCode.decode('latin_1')))
+	navaids = [tokens for tokens, rowCode in zip(rows, rowCodes) if rowCode in _NAV_TYPES]
+	if set(map(len, navaids)).difference((9, )):
+		_checkTokens([tokens if rowCode in _NAV_TYPES else [None] * 9
+			for tokens, rowCode in zip(rows, rowCodes)], 9)
+
+	records = [dict(
+		type      = _NAV_TYPES[rowCode],
+		coords    = (float(lat), float(lon)),
+		elevation = int(elevation),
+		freq      = int(freq),
+		recRange  = int(recRange),
+		code      = code.decode('latin_1'),
+		name      = name.decode('latin_1'))
+		for rowCode, lat, lon, elevation, freq, recRange, value, code, name in navaids]
+	# VORs have the slaved variation and DMEs the bias in the same column; NDBs leave it unused
+	for record, tokens in zip(records, navaids):
+		if _NAV_FLOATS[record['type']] is not None:
+			record[_NAV_FLOATS[record['type']]] = float(tokens[6])
+	return records, end is not None
+
+def _parseAwy(data):
+	end = _endOffset(data)
+	codesA, latsA, lonsA, codesB, latsB, lonsB, highs, bases, tops, idents = _columns(data[:end],
+		(None, float, float, None, float, float, None, int, int, None))
+	if not {'1', '2'}.issuperset(highs):
+		for n, high in enumerate(highs):
+			if high != '1' and high != '2':
+				raise _ParseError(n + 1, "Invalid airway type '{0}.".format(high))
+	return [(segmentIdents.split('-'), dict(
+		waypoints = (
+			dict(code = codeA, coords = coordsA),
+			dict(code = codeB, coords = coordsB)),
+		high = high == '2',
+		base = base,
+		top  = top)) for segmentIdents, codeA, coordsA, codeB, coordsB, high, base, top in zip(
+			idents, codesA, zip(latsA, lonsA), codesB, zip(latsB, lonsB), highs, bases, tops)], \
+		end is not None
+
+# apt.dat row code -> (number of tokens, indexes of the latitude and longitude tokens of each point
+# on the airport) for the rows used. Headers have no points. Water runways are not used, and
+# helipads are read from row 103 while row 102 is only checked to follow a header. Rows may have
+# more tokens than given; the last token of a header, the name, can contain spaces.
+_APT_HEADER = (6, ())
+_APT_ROWS = {
+	b'1':   _APT_HEADER,
+	b'16':  _APT_HEADER,
+	b'17':  _APT_HEADER,
+	b'100': (26, ((9, 10), (18, 19))),
+	b'102': (0, ()),
+	b'103': (12, ((2, 3), ))}
+_APT_HEADERS = frozenset(code for code, row in _APT_ROWS.items() if row is _APT_HEADER)
+
+# Rows of the codes above. They are picked out of the data without splitting the other rows, which
+# are most of the file. Anchoring on the newline before a row is far quicker than a multiline ^;
+# the first row of the data is matched separately.
+_APT_ROW_PATTERN = rb'[ \t]*((?:1|16|17|100|102|103)[ \t][^\n]*)'
+_APT_ROW = re.compile(rb'\n' + _APT_ROW_PATTERN)
+_APT_FIRST_ROW = re.compile(_APT_ROW_PATTERN)
+
+# Returns the index of the first line of the data holding the given row
+def _rowIndex(data, row):
+	return [line.lstrip(b' \t') for line in data.split(b'\n')].index(row)
+
+# The airport data unhelpfully doesn't include the airport reference point, so use the geographical
+# centre of the airport taking into account runways and helipads
+def _parseApt(data):
+	end = _endOffset(data)
+	finished = end is not None
+	if end is None:
+		end = len(data)
+	first = _APT_FIRST_ROW.match(data, 0, end)
+	rows = ([first.group(1)] if first is not None else [ ]) + _APT_ROW.findall(data, 0, end)
+	rowTokens = [row.split(None, 25) for row in rows]
+	rowCodes = [tokens[0] for tokens in rowTokens]
+	for rowCode, length in set(zip(rowCodes, map(len, rowTokens))):
+		if length < _APT_ROWS[rowCode][0]:
+			for row, tokens in zip(rows, rowTokens):
+				if tokens[0] == rowCode and len(tokens) == length:
+					raise _tokenError(_rowIndex(data, row), tokens, _APT_ROWS[rowCode][0])
+	if len(rows) != 0 and rowCodes[0] not in _APT_HEADERS:
+		raise _ParseError(_rowIndex(data, rows[0]) + 1, 'Runway before airport header.')
+
+	headers = [row.split(None, 5) for row, rowCode in zip(rows, rowCodes) if rowCode in _APT_HEADERS]
+	# Number of the airport each row belongs to, counting from 1, and the points of each airport
+	airports = accumulate(map(_APT_HEADERS.__contains__, rowCodes))
+	points = [(airport, tokens[lat], tokens[lon]) for airport, tokens in zip(airports, rowTokens)
+		for lat, lon in _APT_ROWS[tokens[0]][1]]
+	owners, lats, lons = zip(*points) if len(points) != 0 else ((), (), ())
+
+	# Average coordinates
+	totals = [[0, 0, 0] for tokens in headers]
+	for owner, lat, lon in zip(owners, map(float, lats), map(float, lons)):
+		total = totals[owner - 1]
+		total[0] += lat
+		total[1] += lon
+		total[2] += 1
+	return [dict(
+		coords    = (lat / count, lon / count),
+		elevation = int(tokens[1]),
+		code      = tokens[4].decode('latin_1'),
+		name      = tokens[5].decode('latin_1'))
+		for tokens, (lat, lon, count) in zip(headers, totals) if count != 0], finished
+
+_PARSERS = dict(fix = _parseFix, nav = _parseNav, awy = _parseAwy, apt = _parseApt)
+_PACKERS = dict(
+	fix = (_packFix, _unpackFix),
+	nav = (_packNav, _unpackNav),
+	awy = (_packAwy, _unpackAwy),
+	apt = (_packApt, _unpackApt))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Resident route parsing service. The navdata is loaded once and requests are then answered over
+#  a Unix socket or a localhost TCP port using JSON lines: each request is a JSON object on one line
+#  and gets a JSON object on one line in reply, in the order the requests were sent.
+#
+#  Requests have an "op" and an optional "id" which is echoed in the reply:
+#   - parse: "route", and optionally "bestGuess" (default true), "missingOk" (default false),
+#     "cruiseLevel" (a flight level, default none) and "solve" (default false) to use
+#     IfrRoute.solve() instead of IfrRoute.append(). The result has the "waypoints" and the
+#     "failure", if any, with its "choices" and "suggestions" of navaids.
+#   - findAirway: "airway", "src" and "dest" codes, and optionally "coords" near the source navaid
+#     to choose between navaids sharing its code and "cruiseLevel". The result has the "waypoints",
+#     or null if the airway wasn't found. Without "coords" each navaid with the source code is
+#     tried, nearest to (0, 0) first, as when parsing a route with a best guess.
+#   - nearest: "coords", and optionally "k" (default 1) and "types". The result is a list of
+#     navaids, each with its "distance".
+#
+#  Replies have "ok" and either the "result" or an "error" message, and "elapsedUs", the time taken
+#  to handle the request in microseconds. Airways are given by their code. A request that is
+#  malformed, has fields of the wrong type, or is longer than 64 KiB gets an error reply and the
+#  connection stays open.
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ifrroute import IfrRoute
+from navdata import NavData
+
+## Serves requests for a navdata.
+class RouteServer:
+	## Constructor.
+	#  \param navdata Navdata to answer requests from.
+	#  \param executor Executor the requests are handled in, so that parsing doesn't hold up the
+	#  connections. By default a single thread is used, as the navdata's lazily built indexes and
+	#  caches aren't safe to use from several threads at once.
+	def __init__(self, navdata, executor = None):
+		self.navdata = navdata
+		self._executor = executor if executor is not None else ThreadPoolExecutor(1)
+		self._ops = dict(parse = self._parse, findAirway = self._findAirway,
+			nearest = self._nearest)
+
+	## Listens on a Unix socket and serves until cancelled.
+	async def serveUnix(self, path):
+		server = await asyncio.start_unix_server(self._connection, path)
+		async with server:
+			await server.serve_forever()
+
+	## Listens on a TCP port and serves until cancelled.
+	async def serveTcp(self, host = '127.0.0.1', port = 7454):
+		server = await asyncio.start_server(self._connection, host, port)
+		async with server:
+			await server.serve_forever()
+
+	## Handles one request line.
+	#  \param line Request as a JSON string.
+	#  \returns The reply as a dict.
+	def handle(self, line):
+		start = time.perf_counter_ns()
+		id = None
+		try:
+			request = json.loads(line)
+			if not isinstance(request, dict):
+				raise ValueError('request is not an object')
+			id = request.get('id')
+			op = request.get('op')
+			if op not in self._ops:
+				raise ValueError('unknown op {0!r}'.format(op))
+			reply = dict(id = id, ok = True, result = self._ops[op](request))
+		except ValueError as e:
+			reply = dict(id = id, ok = False, error = str(e))
+		except Exception as e:
+			# A request must never take down the connection it came on
+			reply = dict(id = id, ok = False, error = 'internal error: {0!r}'.format(e))
+		reply['elapsedUs'] = (time.perf_counter_ns() - start) // 1000
+		return reply
+
+	async def _connection(self, reader, writer):
+		loop = asyncio.get_running_loop()
+		try:
+			while True:
+				line = await _readLine(reader)
+				if line is None:
+					reply = dict(id = None, ok = False, error = 'request too long', elapsedUs = 0)
+				elif not line:
+					break
+				elif not line.strip():
+					continue
+				else:
+					reply = await loop.run_in_executor(self._executor, self.handle, line)
+				writer.write(json.dumps(reply).encode() + b'\n')
+				await writer.drain()
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+	def _parse(self, request):
+		route = IfrRoute(self.navdata)
+		routeString = _field(request, 'route', str)
+		missingOk = _field(request, 'missingOk', bool, False)
+		cruiseLevel = _field(request, 'cruiseLevel', int, None)
+		if _field(request, 'solve', bool, False):
+			failure = route.solve(routeString, missingOk, cruiseLevel)
+		else:
+			failure = route.append(routeString, _field(request, 'bestGuess', bool, True), missingOk,
+				cruiseLevel = cruiseLevel)
+		return dict(waypoints = [_legJson(leg) for leg in route.waypoints],
+			failure = _failureJson(failure))
+
+	def _findAirway(self, request):
+		code = _field(request, 'airway', str).upper()
+		src = _field(request, 'src', str).upper()
+		dest = _field(request, 'dest', str).upper()
+		coords = _coordsField(request, None)
+		cruiseLevel = _field(request, 'cruiseLevel', int, None)
+		if src not in self.navdata.navaids:
+			raise ValueError('navaid {0} not found'.format(src))
+
+		# Given coordinates choose the source navaid; otherwise, as with a best guess when parsing a
+		# route, each navaid with the code is tried in turn
+		candidates = self.navdata.nearestNavaids(src, (0, 0) if coords is None else coords)
+		for navaid in candidates if coords is None else candidates[:1]:
+			waypoints, airway = self.navdata.findAirway(code, navaid, dest, cruiseLevel)
+			if waypoints is not None:
+				return dict(waypoints = [_legJson(leg) for leg in waypoints])
+		return dict(waypoints = None)
+
+	def _nearest(self, request):
+		types = _field(request, 'types', list, None)
+		if types is not None and not all(isinstance(type, str) for type in types):
+			raise ValueError('types must be a list of strings')
+		nearest = self.navdata.nearest(_coordsField(request), _field(request, 'k', int, 1),
+			None if types is None else set(types))
+		return [dict(_navaidJson(navaid), distance = distance) for distance, navaid in nearest]
+
+# Reads a request line from a stream. Returns b'' at the end of the stream, or None if the line is
+# longer than the stream's limit, once the rest of it has been read and dropped.
+async def _readLine(reader):
+	tooLong = False
+	while True:
+		try:
+			line = await reader.readuntil(b'\n')
+		except asyncio.IncompleteReadError as e:
+			# The last line needn't end with a newline
+			line = e.partial
+		except asyncio.LimitOverrunError as e:
+			# Nothing was read: drop what was checked for the newline and look again
+			tooLong = True
+			await reader.readexactly(e.consumed)
+			continue
+		return None if tooLong else line
+
+_REQUIRED = object()
+
+# JSON names of the types fields are checked against
+_TYPE_NAMES = {str: 'a string', bool: 'true or false', int: 'an integer', list: 'a list'}
+
+# Returns a field of a request, raising ValueError if it is missing and has no default or if it
+# isn't of the given type. A null field is taken as missing.
+def _field(request, name, type, default = _REQUIRED):
+	value = request.get(name)
+	if value is None:
+		if default is _REQUIRED:
+			raise ValueError('missing {0!r}'.format(name))
+		return default
+	# JSON true and false are ints in Python
+	if not isinstance(value, type) or (type is not bool and isinstance(value, bool)):
+		raise ValueError('{0} must be {1}'.format(name, _TYPE_NAMES[type]))
+	return value
+
+# Returns the "coords" field of a request as a (lat, lon) tuple
+def _coordsField(request, default = _REQUIRED):
+	coords = _field(request, 'coords', list, default)
+	if coords is default:
+		return default
+	if len(coords) != 2 or not all(isinstance(value, (int, float)) and not isinstance(value, bool)
+		for value in coords):
+		raise ValueError('coords must be a list of a latitude and a longitude')
+	return (float(coords[0]), float(coords[1]))
+
+def _navaidJson(navaid):
+	return dict(navaid)
+
+def _legJson(leg):
+	result = _navaidJson(leg.navaid)
+	result.update(inAwy = _airwayCode(leg.inAwy), outAwy = _airwayCode(leg.outAwy),
+		distance = leg.distance, cumDistance = leg.cumDistance)
+	return result
+
+def _airwayCode(airway):
+	return None if airway is None else airway['code']
+
+def _failureJson(failure):
+	if failure is None:
+		return None
+	failure = dict(failure)
+	failure['choices'] = [_navaidJson(navaid) for navaid in failure['choices']]
+	failure['suggestions'] = [_navaidJson(navaid) for navaid in failure['suggestions']]
+	return failure
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Serves route parsing requests.')
+	parser.add_argument('navdata', help = 'path to the navdata')
+	parser.add_argument('--unix', metavar = 'PATH', help = 'listen on a Unix socket')
+	parser.add_argument('--port', type = int, default = 7454, help = 'localhost TCP port')
+	parser.add_argument('--cache', action = 'store_true', help = 'cache parsed routes')
+	args = parser.parse_args()
+
+	navdata = NavData.load(args.navdata)
+	if args.cache:
+		navdata.enableCache()
+	# Build the spatial index and the index of navaid codes up front rather than on the first
+	# requests
+	navdata.nearest((0.0, 0.0))
+	navdata.suggestNavaids('')
+	server = RouteServer(navdata)
+	print('Navdata loaded; listening', file = sys.stderr)
+	try:
+		if args.unix is not None:
+			asyncio.run(server.serveUnix(args.unix))
+		else:
+			asyncio.run(server.serveTcp(port = args.port))
+	except KeyboardInterrupt:
+		pass
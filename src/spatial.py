@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from heapq import nsmallest
+from math import *
+
+from geo import EARTH_RADIUS, coordsDistanceMany, coordsRadians, indexesWithin, numpy
+
+## Navaids bucketed into cells of one degree of latitude and longitude, for finding the navaids
+#  near a point without scanning them all. Each type of navaid also has cells of its own, so that a
+#  search for some types never looks at the others.
+class SpatialGrid:
+	## Size of a cell in degrees.
+	CELL = 1.0
+
+	## Constructor.
+	#  \param navaids Iterable of navaids.
+	def __init__(self, navaids):
+		navaids = list(navaids)
+		coords = [navaid['coords'] for navaid in navaids]
+		lonCells = int(360 / self.CELL)
+		keys = [int(floor(lat / self.CELL)) * lonCells + int(floor(lon / self.CELL)) % lonCells
+			for lat, lon in coords]
+		points = coordsRadians(coords)
+
+		# Positions of the navaids sorted by cell, for all types (None) and for each type
+		order = sorted(range(len(navaids)), key = keys.__getitem__)
+		orders = {None: order}
+		for position in order:
+			orders.setdefault(navaids[position].get('type', 'apt'), [ ]).append(position)
+
+		# For each type the navaids in that order, with their coordinates in radians, and the range
+		# of each cell's navaids
+		self._tables = { }
+		for type, typeOrder in orders.items():
+			cells = { }
+			start = 0
+			for n in range(1, len(typeOrder) + 1):
+				if n == len(typeOrder) or keys[typeOrder[n]] != keys[typeOrder[start]]:
+					cells[keys[typeOrder[start]]] = (start, n)
+					start = n
+			if numpy is not None:
+				typePoints = points[typeOrder]
+			else:
+				typePoints = [points[position] for position in typeOrder]
+			self._tables[type] = ([navaids[position] for position in typeOrder], typePoints, cells)
+		self.count = len(navaids)
+
+	# Returns the tables of the given types, or of all types if None, and the number of navaids in
+	# them
+	def _typeTables(self, types):
+		if types is None:
+			return [self._tables[None]], self.count
+		tables = [self._tables[type] for type in set(types) if type is not None and type in self._tables]
+		return tables, sum(len(table[0]) for table in tables)
+
+	# Returns the keys of the cells covering a radius around a point. Near the poles every longitude
+	# is covered. A cell's key is its latitude index times the number of longitude cells plus its
+	# longitude index.
+	def _cellKeys(self, coords, radius):
+		latSpan = degrees(radius / EARTH_RADIUS)
+		south, north = max(coords[0] - latSpan, -90.0), min(coords[0] + latSpan, 90.0)
+		lonCells = int(360 / self.CELL)
+		maxLat = max(abs(south), abs(north))
+		if maxLat >= 90.0 or latSpan >= 90.0:
+			lonRange = range(lonCells)
+		else:
+			lonSpan = min(latSpan / cos(radians(maxLat)), 180.0)
+			west = int(floor((coords[1] - lonSpan) / self.CELL))
+			east = int(floor((coords[1] + lonSpan) / self.CELL))
+			lonRange = range(west, min(east, west + lonCells - 1) + 1)
+		latRange = range(int(floor(south / self.CELL)), int(floor(north / self.CELL)) + 1)
+		return [lat * lonCells + lon % lonCells for lat in latRange for lon in lonRange]
+
+	## Returns the navaids within a radius of a point.
+	#  \param coords Centre tuple (lat, lon).
+	#  \param radius Radius in nautical miles.
+	#  \param types If not \c None, only navaids of these types are returned. Airports have the type
+	#  'apt'.
+	#  \returns A list of (distance, navaid) tuples, nearest first.
+	def within(self, coords, radius, types = None):
+		tables, count = self._typeTables(types)
+		results = [ ]
+		for key in self._cellKeys(coords, radius):
+			for navaids, points, cells in tables:
+				cell = cells.get(key)
+				if cell is None:
+					continue
+				start, end = cell
+				distances = coordsDistanceMany(coords, points[start:end], inRadians = True)
+				for n in indexesWithin(distances, radius):
+					results.append((float(distances[n]), navaids[start + n]))
+		results.sort(key = lambda result: result[0])
+		return results
+
+	## Returns the navaids nearest to a point.
+	#  \param coords Point tuple (lat, lon).
+	#  \param k Maximum number of navaids to return.
+	#  \param types If not \c None, only navaids of these types are returned.
+	#  \returns A list of (distance, navaid) tuples, nearest first.
+	def nearest(self, coords, k = 1, types = None):
+		tables, count = self._typeTables(types)
+		if count == 0 or k < 1:
+			return [ ]
+
+		# Widen the search until enough navaids are found, starting at the radius that would hold k
+		# navaids if they were spread evenly. Each cell is only scanned once; all the navaids in the
+		# cells scanned are kept, and once k of them are within the radius searched they are the
+		# nearest k.
+		radius = max(30.0, 2 * EARTH_RADIUS * sqrt(k / count))
+		scanned = set()
+		candidates = [ ]
+		while True:
+			for key in self._cellKeys(coords, radius):
+				if key in scanned:
+					continue
+				scanned.add(key)
+				for navaids, points, cells in tables:
+					cell = cells.get(key)
+					if cell is not None:
+						start, end = cell
+						distances = coordsDistanceMany(coords, points[start:end], inRadians = True)
+						candidates += zip(map(float, distances), navaids[start:end])
+			if radius >= pi * EARTH_RADIUS or \
+				sum(1 for candidate in candidates if candidate[0] <= radius) >= k:
+				return nsmallest(k, candidates, key = lambda candidate: candidate[0])
+			radius *= 2
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Timers and counters of the work done by NavData and IfrRoute, for finding out where the time
+#  goes. Enable them with NavData.enableStats(); while disabled nothing is recorded and the hot
+#  paths only test for \c None.
+#
+#  Timers, in seconds:
+#   - load.<type>: parsing each navdata file ('awy', 'fix', 'nav' or 'apt')
+#   - load.store: storing the parsed navaids
+#   - load.assembly: joining airway segments into airways
+#   - route.append, route.solve: whole calls of IfrRoute.append() and IfrRoute.solve()
+#   - route.tokenize: splitting routes into tokens
+#   - route.candidates: finding and sorting the navaids matching a code
+#   - route.airway: finding airways between waypoints and expanding them into waypoints
+#
+#  Counters:
+#   - candidates: navaids considered for route waypoints
+#   - airwayProbes: airway lookups made while parsing routes
+#   - airwayScans: airways sharing an identifier searched for the source and destination
+#   - airwayWaypoints: airway waypoints expanded into routes
+#   - routeCache.hits, routeCache.misses, airwayCache.hits, airwayCache.misses
+class Stats:
+	def __init__(self):
+		## Dict of timer name -> [number of times, total seconds]
+		self.timers = { }
+		## Dict of counter name -> count
+		self.counters = { }
+		self._hooks = [ ]
+
+	## Adds a time to a timer.
+	def time(self, name, seconds):
+		if name in self.timers:
+			timer = self.timers[name]
+			timer[0] += 1
+			timer[1] += seconds
+		else:
+			self.timers[name] = [1, seconds]
+		for hook in self._hooks:
+			hook('timer', name, seconds)
+
+	## Adds to a counter.
+	def count(self, name, n = 1):
+		self.counters[name] = self.counters.get(name, 0) + n
+		for hook in self._hooks:
+			hook('counter', name, n)
+
+	## Adds a function to be called with each time and count as it is recorded, as
+	#  <tt>hook(kind, name, value)</tt> where the kind is 'timer' or 'counter'.
+	def addHook(self, hook):
+		self._hooks.append(hook)
+
+	## Removes a function added with addHook().
+	def removeHook(self, hook):
+		self._hooks.remove(hook)
+
+	## Sets all timers and counters back to zero. The hooks are kept.
+	def reset(self):
+		self.timers.clear()
+		self.counters.clear()
+
+	## Returns the timers and counters as a dict, with the number of times, total and mean of each
+	#  timer in seconds.
+	def report(self):
+		return dict(
+			timers = dict((name, dict(count = count, total = total, mean = total / count))
+				for name, (count, total) in self.timers.items()),
+			counters = dict(self.counters))
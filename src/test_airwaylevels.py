@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks the flight levels at which runs of airway segments are open: the bands of
+#  _AirwayIndex.levelOpen() at their edges and across closed segments, and the choice between a
+#  low and a high airway sharing an ident when a route is parsed at a cruise level.
+
+import contextlib
+import io
+import tempfile
+import unittest
+
+from ifrroute import IfrRoute
+from navdata import NavData, _AirwayIndex
+from navgen import write
+
+# Returns an airway through navaids at (0, n), with each segment open between the given base and top
+def _airway(levels):
+	waypoints = [dict(base = base, top = top,
+		navaid = dict(code = 'WP{0}'.format(n), coords = (0, n)))
+		for n, (base, top) in enumerate(levels + [(None, None)])]
+	return dict(code = 'AW1', high = False, waypoints = waypoints)
+
+class LevelOpenTest(unittest.TestCase):
+	def setUp(self):
+		# Segment 2 is the only high one
+		self.index = _AirwayIndex(_airway([(50, 180), (50, 180), (180, 460), (50, 180)]))
+
+	def testTop(self):
+		self.assertTrue(self.index.levelOpen(0, 4, 180))
+		self.assertTrue(self.index.levelOpen(0, 2, 180))
+		self.assertTrue(self.index.levelOpen(2, 3, 460))
+		self.assertFalse(self.index.levelOpen(2, 3, 461))
+		self.assertFalse(self.index.levelOpen(0, 1, 181))
+
+	def testBase(self):
+		self.assertTrue(self.index.levelOpen(0, 2, 50))
+		self.assertFalse(self.index.levelOpen(2, 3, 179))
+
+	def testBelowBases(self):
+		self.assertFalse(self.index.levelOpen(0, 1, 40))
+		self.assertFalse(self.index.levelOpen(0, 4, 0))
+		self.assertFalse(self.index.levelOpen(2, 3, 49))
+
+	def testAboveTops(self):
+		self.assertFalse(self.index.levelOpen(2, 3, 500))
+
+	def testSamePosition(self):
+		# No segment is flown, so any level will do
+		self.assertTrue(self.index.levelOpen(1, 1, 40))
+		self.assertTrue(self.index.levelOpen(3, 3, 500))
+
+	def testClosedSegment(self):
+		self.assertTrue(self.index.levelOpen(0, 2, 100))
+		self.assertTrue(self.index.levelOpen(3, 4, 100))
+		self.assertFalse(self.index.levelOpen(1, 4, 100))
+		self.assertFalse(self.index.levelOpen(2, 3, 100))
+		self.assertFalse(self.index.levelOpen(0, 3, 300))
+
+	def testReverse(self):
+		self.assertTrue(self.index.levelOpen(2, 0, 100))
+		self.assertTrue(self.index.levelOpen(4, 3, 100))
+		self.assertFalse(self.index.levelOpen(4, 1, 100))
+		self.assertTrue(self.index.levelOpen(3, 2, 300))
+		self.assertFalse(self.index.levelOpen(4, 2, 300))
+
+	def testNoLevels(self):
+		index = _AirwayIndex(_airway([(None, None), (None, None)]))
+		self.assertFalse(index.levelOpen(0, 2, 100))
+		self.assertTrue(index.levelOpen(1, 1, 100))
+
+class CruiseLevelTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		# A low AW1 through BBBBB and a high one through DDDDD both join AAAAA to CCCCC
+		cls._directory = tempfile.TemporaryDirectory()
+		a, b, c, d = (0, 0, 'AAAAA'), (1, 1, 'BBBBB'), (0, 2, 'CCCCC'), (-1, 1, 'DDDDD')
+		write(cls._directory.name, [a, b, c, d], [
+			((a, d), True, 180, 460, 'AW1'),
+			((d, c), True, 180, 460, 'AW1'),
+			((a, b), False, 50, 180, 'AW1'),
+			((b, c), False, 50, 180, 'AW1')])
+		with contextlib.redirect_stderr(io.StringIO()):
+			cls.navdata = NavData(cls._directory.name)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._directory.cleanup()
+
+	def _via(self, cruiseLevel):
+		route = IfrRoute(self.navdata)
+		failure = route.append('AAAAA AW1 CCCCC', cruiseLevel = cruiseLevel)
+		if failure is not None:
+			return failure['code']
+		return [waypoint['code'] for waypoint in route.waypoints]
+
+	def testLow(self):
+		self.assertEqual(self._via(100), ['AAAAA', 'BBBBB', 'CCCCC'])
+		self.assertEqual(self._via(179), ['AAAAA', 'BBBBB', 'CCCCC'])
+
+	def testHigh(self):
+		self.assertEqual(self._via(181), ['AAAAA', 'DDDDD', 'CCCCC'])
+		self.assertEqual(self._via(300), ['AAAAA', 'DDDDD', 'CCCCC'])
+
+	def testClosed(self):
+		self.assertEqual(self._via(40), 'AW1')
+		self.assertEqual(self._via(500), 'AW1')
+
+if __name__ == '__main__':
+	unittest.main()
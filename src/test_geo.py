@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that coordsDistance() and coordsDistanceMany() agree with each other and with the
+#  haversine distance, with and without NumPy.
+
+import random
+import unittest
+from math import *
+
+import geo
+from geo import EARTH_RADIUS, coordsDistance, coordsDistanceMany, coordsRadians
+
+# One degree of a great circle in nautical miles
+DEGREE = radians(1) * EARTH_RADIUS
+
+def haversine(standpoint, forepoint):
+	s = (radians(standpoint[0]), radians(standpoint[1]))
+	f = (radians(forepoint[0]), radians(forepoint[1]))
+	a = sin((f[0] - s[0]) / 2) ** 2 + cos(s[0]) * cos(f[0]) * sin((f[1] - s[1]) / 2) ** 2
+	return 2 * EARTH_RADIUS * asin(min(sqrt(a), 1.0))
+
+# Pairs of points and their distances in nautical miles
+CASES = [
+	# Along the equator; coordsDistance used to use the longitudes in place of the latitudes, which
+	# gave about 583 nm for this
+	(((0.0, 10.0), (0.0, 20.0)), 10 * DEGREE),
+	(((0.0, 0.0), (0.0, 0.0)), 0.0),
+	(((45.0, 7.0), (46.0, 7.0)), DEGREE),
+	# Across the antimeridian, both ways round
+	(((0.0, 179.5), (0.0, -179.5)), DEGREE),
+	(((0.0, -179.5), (0.0, 179.5)), DEGREE),
+	(((10.0, 180.0), (10.0, -180.0)), 0.0),
+	# At and through the poles; the longitude of a pole doesn't matter
+	(((90.0, 0.0), (90.0, 123.0)), 0.0),
+	(((90.0, 0.0), (89.0, 123.0)), DEGREE),
+	(((-90.0, 45.0), (-89.0, -170.0)), DEGREE),
+	(((89.0, 0.0), (89.0, 180.0)), 2 * DEGREE),
+	(((90.0, 0.0), (-90.0, 0.0)), 180 * DEGREE),
+	# Antipodes
+	(((30.0, 40.0), (-30.0, -140.0)), 180 * DEGREE),
+]
+
+def randomPoints(count, seed):
+	rand = random.Random(seed)
+	return [(rand.uniform(-90, 90), rand.uniform(-180, 180)) for n in range(count)]
+
+class CoordsDistanceTest(unittest.TestCase):
+	def setUp(self):
+		self._numpy = geo.numpy
+
+	def tearDown(self):
+		geo.numpy = self._numpy
+
+	def testKnownDistances(self):
+		for (standpoint, forepoint), expected in CASES:
+			self.assertAlmostEqual(coordsDistance(standpoint, forepoint), expected, delta = 1e-6,
+				msg = '{0} to {1}'.format(standpoint, forepoint))
+
+	def testHaversine(self):
+		points = randomPoints(500, 1)
+		for standpoint, forepoint in zip(points, points[1:]):
+			self.assertAlmostEqual(coordsDistance(standpoint, forepoint),
+				haversine(standpoint, forepoint), delta = 1e-6)
+
+	def testManyWithNumPy(self):
+		if geo.numpy is None:
+			self.skipTest('NumPy is not available')
+		self._checkMany()
+
+	def testManyWithoutNumPy(self):
+		geo.numpy = None
+		self._checkMany()
+
+	def _checkMany(self):
+		standpoints = [pair[0] for pair, expected in CASES] + randomPoints(20, 2)
+		forepoints = [pair[1] for pair, expected in CASES] + randomPoints(200, 3)
+		for standpoint in standpoints:
+			expected = [coordsDistance(standpoint, forepoint) for forepoint in forepoints]
+			for distances in (coordsDistanceMany(standpoint, forepoints),
+				coordsDistanceMany(standpoint, coordsRadians(forepoints), inRadians = True)):
+				self.assertEqual(len(distances), len(forepoints))
+				for distance, wanted in zip(distances, expected):
+					self.assertAlmostEqual(float(distance), wanted, delta = 1e-6)
+
+	def testManyEmpty(self):
+		self.assertEqual(len(coordsDistanceMany((0.0, 0.0), [ ])), 0)
+		geo.numpy = None
+		self.assertEqual(len(coordsDistanceMany((0.0, 0.0), [ ])), 0)
+
+if __name__ == '__main__':
+	unittest.main()
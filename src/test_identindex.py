@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks the prefix and near match lookups of IdentIndex against scanning every ident, and the
+#  edit counts of editDistance().
+
+import random
+import unittest
+
+from identindex import IdentIndex, editDistance
+
+# Pairs of strings and the number of edits between them
+DISTANCES = [
+	('ABCDE', 'ABCDE', 0),
+	('', '', 0),
+	('', 'ABC', 3),
+	('ABCDE', 'ABXDE', 1),
+	('ABCDE', 'ABCD', 1),
+	('ABCDE', 'XABCDE', 1),
+	# A swap of neighbours is one edit; further apart it is two changes
+	('ABCDE', 'ABDCE', 1),
+	('ABCDE', 'ADCBE', 2),
+	('ABCDE', 'AXCYE', 2),
+	('ABCDE', 'BCDEX', 2),
+	('ABCDE', 'ABC', 2),
+	('ABCDE', 'BADCE', 2),
+	('LAM', 'LMA', 1),
+	('KATUL', 'KTAUL', 1),
+	('ABCDE', 'VWXYZ', 5),
+]
+
+def randomIdents(rand, count):
+	# Few letters, so that plenty of idents are near each other
+	return [''.join(rand.choice('ABCDE') for n in range(rand.randint(2, 5))) for n in range(count)]
+
+class EditDistanceTest(unittest.TestCase):
+	def testKnownDistances(self):
+		for a, b, expected in DISTANCES:
+			self.assertEqual(editDistance(a, b), expected, msg = '{0} {1}'.format(a, b))
+			self.assertEqual(editDistance(b, a), expected, msg = '{0} {1}'.format(b, a))
+
+	def testLimit(self):
+		for a, b, expected in DISTANCES:
+			for limit in range(4):
+				self.assertEqual(editDistance(a, b, limit), min(expected, limit + 1),
+					msg = '{0} {1} {2}'.format(a, b, limit))
+
+	def testLimitScan(self):
+		# Small limits are checked edit by edit rather than counted
+		rand = random.Random(2)
+		idents = randomIdents(rand, 400) + ['', 'A', 'ABCDEFG']
+		for a in idents[:60]:
+			for b in idents:
+				expected = editDistance(a, b)
+				for limit in range(4):
+					self.assertEqual(editDistance(a, b, limit), min(expected, limit + 1),
+						msg = '{0} {1} {2}'.format(a, b, limit))
+
+class IdentIndexTest(unittest.TestCase):
+	def setUp(self):
+		rand = random.Random(1)
+		self.idents = sorted(set(randomIdents(rand, 600)))
+		self.queries = randomIdents(rand, 150) + self.idents[:50]
+		self.index = IdentIndex(self.idents)
+
+	def testPrefixed(self):
+		index = IdentIndex(['BAB', 'ABC', 'AB', 'ABD', 'ABCDE', 'ABC', 'XAB'])
+		self.assertEqual(index.prefixed('AB'), ['AB', 'ABC', 'ABCDE', 'ABD'])
+		self.assertEqual(index.prefixed('ABC'), ['ABC', 'ABCDE'])
+		self.assertEqual(index.prefixed('AB', limit = 2), ['AB', 'ABC'])
+		self.assertEqual(index.prefixed('ABCDEF'), [ ])
+		self.assertEqual(index.prefixed('Z'), [ ])
+		self.assertEqual(index.prefixed(''), ['AB', 'ABC', 'ABCDE', 'ABD', 'BAB', 'XAB'])
+
+	def testPrefixedScan(self):
+		for prefix in ('A', 'AB', 'EDC', 'BBBBB'):
+			self.assertEqual(self.index.prefixed(prefix, limit = len(self.idents)),
+				[ident for ident in self.idents if ident.startswith(prefix)])
+
+	# Returns the idents near the query by scanning them all. Idents two edits apart are only matched
+	# if one of them is long enough.
+	def _scan(self, query, maxEdits):
+		matches = ((editDistance(query, ident, maxEdits), ident) for ident in self.idents)
+		return sorted((edits, ident) for edits, ident in matches if ident != query and
+			(edits <= 1 or (edits <= maxEdits and
+			max(len(query), len(ident)) >= IdentIndex.TWO_EDIT_LENGTH)))
+
+	def testSimilarScan(self):
+		# Without a limit on the candidates checked, so that every match is found
+		self.index.TWO_EDIT_CANDIDATES = len(self.idents)
+		for maxEdits in (1, 2):
+			for query in self.queries:
+				self.assertEqual(self.index.similar(query, maxEdits), self._scan(query, maxEdits),
+					msg = '{0} within {1}'.format(query, maxEdits))
+
+	def testCandidateLimit(self):
+		self.index.TWO_EDIT_CANDIDATES = 5
+		limited = 0
+		for query in self.queries:
+			expected = self._scan(query, 2)
+			found = self.index.similar(query, 2)
+			self.assertTrue(set(found).issubset(expected), msg = query)
+			# Every ident one edit away is still found
+			self.assertEqual([match for match in found if match[0] <= 1],
+				[match for match in expected if match[0] <= 1], msg = query)
+			self.assertEqual(found, self.index.similar(query, 2), msg = query)
+			if len(found) < len(expected):
+				limited += 1
+		self.assertNotEqual(limited, 0)
+
+	def testShortIdents(self):
+		# Two edits between idents shorter than TWO_EDIT_LENGTH aren't matched
+		index = IdentIndex(['ABC', 'ABCD', 'XBCY', 'ABXYE', 'BCDE'])
+		self.assertEqual(index.similar('XBCD'), [(1, 'ABCD'), (1, 'XBCY')])
+		self.assertEqual(index.similar('ABCDE'), [(1, 'ABCD'), (1, 'BCDE'), (2, 'ABC'), (2, 'ABXYE')])
+		self.assertEqual(index.similar(''), [ ])
+
+	def testSimilarTwoChanges(self):
+		index = IdentIndex(['KATUL', 'KOTAL', 'LAMSO'])
+		self.assertEqual(index.similar('KOTUL'), [(1, 'KATUL'), (1, 'KOTAL')])
+		self.assertEqual(index.similar('KXTYL'), [(2, 'KATUL'), (2, 'KOTAL')])
+		self.assertEqual(index.similar('KXTYL', 1), [ ])
+		self.assertEqual(index.similar('ALMOS'), [(2, 'LAMSO')])
+
+	def testOneEditIndex(self):
+		index = IdentIndex(self.idents, maxEdits = 1)
+		for query in self.queries:
+			self.assertEqual(index.similar(query, 1), self.index.similar(query, 1))
+		self.assertRaises(ValueError, index.similar, 'ABC', 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks route parsing with IfrRoute on small hand-made navdata sets: the candidate lattice and
+#  shortest path of solve(), compared with the nearest-first parse of append(), and routes going
+#  straight from one airway onto another.
+
+import contextlib
+import io
+import tempfile
+import unittest
+
+from ifrroute import IfrRoute
+from navdata import NavData
+from navgen import write
+
+# Loads a navdata set of the given fixes and airway segments, as taken by navgen.write()
+def _navData(path, fixes, segments):
+	write(path, fixes, segments)
+	with contextlib.redirect_stderr(io.StringIO()):
+		return NavData(path)
+
+def _codes(route):
+	return [waypoint['code'] for waypoint in route.waypoints]
+
+# Codes of the airways each waypoint is reached by and left along
+def _airways(route):
+	return [tuple(None if airway is None else airway['code'] for airway in (waypoint.inAwy,
+		waypoint.outAwy)) for waypoint in route.waypoints]
+
+def _coords(route):
+	return [tuple(waypoint['coords']) for waypoint in route.waypoints]
+
+class SolveTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._directory = tempfile.TemporaryDirectory()
+		a, b1, b2, c = (0, 0, 'AAAAA'), (0, 1, 'BBBBB'), (10, 10, 'BBBBB'), (10, 11, 'CCCCC')
+		d1, d2, e = (0, 2.2, 'DDDDD'), (0, -2, 'DDDDD'), (0, 5, 'EEEEE')
+		cls.navdata = _navData(cls._directory.name, [a, b1, b2, c, d1, d2, e], [
+			((a, b1), False, 50, 180, 'AW1'),
+			((b2, c), False, 50, 180, 'AW2'),
+			((b1, e), False, 50, 180, 'AW3')])
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._directory.cleanup()
+
+	def testShortestOverall(self):
+		# The DDDDD nearest AAAAA is out of the way to EEEEE
+		guess = IfrRoute(self.navdata)
+		self.assertIsNone(guess.append('AAAAA DDDDD EEEEE', bestGuess = True))
+		self.assertEqual(_coords(guess)[1], (0, -2))
+		route = IfrRoute(self.navdata)
+		self.assertIsNone(route.solve('AAAAA DDDDD EEEEE'))
+		self.assertEqual(_coords(route), [(0, 0), (0, 2.2), (0, 5)])
+		self.assertLess(route.totalDistance(), guess.totalDistance())
+
+	def testAirways(self):
+		route = IfrRoute(self.navdata)
+		self.assertIsNone(route.solve('AAAAA AW1 BBBBB AW3 EEEEE'))
+		self.assertEqual(_coords(route), [(0, 0), (0, 1), (0, 5)])
+		self.assertEqual(_airways(route), [(None, 'AW1'), ('AW1', 'AW3'), ('AW3', None)])
+		self.assertAlmostEqual(route.totalDistance(), 300, delta = 1)
+
+	def testUnreachableCandidate(self):
+		# Only the BBBBB at (0, 1) is reached along AW1, but AW2 only joins the other to CCCCC
+		route = 'AAAAA AW1 BBBBB AW2 CCCCC'
+		guess = IfrRoute(self.navdata)
+		expected = guess.append(route)
+		self.assertIsNotNone(expected)
+		solved = IfrRoute(self.navdata)
+		self.assertEqual(solved.solve(route), expected)
+		self.assertEqual(expected['code'], 'AW2')
+		self.assertEqual(_coords(solved), [(0, 0), (0, 1)])
+
+	def testMissingNavaid(self):
+		route = IfrRoute(self.navdata)
+		failure = route.solve('AAAAA AW1 BBBBB ZZZZZ')
+		self.assertEqual(failure['code'], 'ZZZZZ')
+		self.assertTrue(failure['navaid'])
+		self.assertEqual(_codes(route), ['AAAAA', 'BBBBB'])
+		route = IfrRoute(self.navdata)
+		self.assertIsNone(route.solve('AAAAA ZZZZZ BBBBB', missingOk = True))
+
+	def testLattice(self):
+		route = IfrRoute(self.navdata)
+		layers, failure = route._buildLattice('AAAAA AW1 BBBBB DCT DDDDD'.split(), False, None)
+		self.assertIsNone(failure)
+		self.assertEqual([layer['code'] for layer in layers], ['AAAAA', 'BBBBB', 'DDDDD'])
+		# Both BBBBBs are candidates, but only the one on AW1 has an edge and is reached
+		airwayLayer = layers[1]
+		self.assertEqual(len(airwayLayer['candidates']), 2)
+		self.assertEqual([(a, b) for a, b, run, distance in airwayLayer['edges']], [(0, 0)])
+		self.assertEqual(airwayLayer['reached'], {0})
+		self.assertIsNone(layers[2]['edges'])
+		self.assertEqual(len(layers[2]['candidates']), 2)
+
+	def testLatticeUnreachable(self):
+		route = IfrRoute(self.navdata)
+		layers, failure = route._buildLattice('AAAAA AW1 BBBBB AW2 CCCCC'.split(), False, None)
+		self.assertEqual([layer['code'] for layer in layers], ['AAAAA', 'BBBBB'])
+		self.assertEqual(failure['code'], 'AW2')
+		self.assertFalse(failure['navaid'])
+		self.assertEqual((failure['wp1'], failure['wp2']), ('BBBBB', 'CCCCC'))
+
+class IntersectionTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		# AW2 leaves AW1 at XXXXA and crosses it again at XXXXB on its way to BBBBB
+		cls._directory = tempfile.TemporaryDirectory()
+		a, x1, p, x2, z = (0, 0, 'AAAAA'), (0, 1, 'XXXXA'), (0, 2, 'PPPPP'), (0, 3, 'XXXXB'), \
+			(0, 4, 'ZZZZZ')
+		n, b = (1, 2, 'NNNNN'), (-1, 4, 'BBBBB')
+		cls.navdata = _navData(cls._directory.name, [a, x1, p, x2, z, n, b], [
+			((a, x1), False, 50, 180, 'AW1'),
+			((x1, p), False, 50, 180, 'AW1'),
+			((p, x2), False, 50, 180, 'AW1'),
+			((x2, z), False, 50, 180, 'AW1'),
+			((x1, n), False, 50, 180, 'AW2'),
+			((n, x2), False, 50, 180, 'AW2'),
+			((x2, b), False, 50, 180, 'AW2')])
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._directory.cleanup()
+
+	def _navaid(self, code):
+		return self.navdata.navaids[code][0]
+
+	def testFindAirwayIntersection(self):
+		self.assertEqual(sorted(code for code, coords in
+			self.navdata.airwayIntersections('AW1', 'AW2')), ['XXXXA', 'XXXXB'])
+		for src, expected in (('AAAAA', ['XXXXA']), ('ZZZZZ', ['XXXXB']),
+			('XXXXA', ['PPPPP', 'XXXXB'])):
+			waypoints, airway = self.navdata.findAirwayIntersection('AW1', self._navaid(src), 'AW2')
+			self.assertEqual([leg.navaid['code'] for leg in waypoints], expected, msg = src)
+			self.assertEqual(airway['code'], 'AW1')
+		self.assertEqual(self.navdata.findAirwayIntersection('AW2', self._navaid('BBBBB'), 'AW3'),
+			(None, None))
+
+	def testNearestCrossing(self):
+		# Both ways of parsing take AW1 to the first crossing, not the second
+		for parse in ('append', 'solve'):
+			route = IfrRoute(self.navdata)
+			self.assertIsNone(getattr(route, parse)('AAAAA AW1 AW2 BBBBB'), msg = parse)
+			self.assertEqual(_codes(route), ['AAAAA', 'XXXXA', 'NNNNN', 'XXXXB', 'BBBBB'],
+				msg = parse)
+			self.assertEqual(_airways(route), [(None, 'AW1'), ('AW1', 'AW2'), ('AW2', 'AW2'),
+				('AW2', 'AW2'), ('AW2', None)], msg = parse)
+
+	def testOtherEnd(self):
+		for parse in ('append', 'solve'):
+			route = IfrRoute(self.navdata)
+			self.assertIsNone(getattr(route, parse)('ZZZZZ AW1 AW2 BBBBB'), msg = parse)
+			self.assertEqual(_codes(route), ['ZZZZZ', 'XXXXB', 'BBBBB'], msg = parse)
+			self.assertEqual(_airways(route), [(None, 'AW1'), ('AW1', 'AW2'), ('AW2', None)],
+				msg = parse)
+
+	def testReverse(self):
+		# From BBBBB the crossing at XXXXB comes first
+		for parse in ('append', 'solve'):
+			route = IfrRoute(self.navdata)
+			failure = getattr(route, parse)('BBBBB AW2 AW1 AAAAA')
+			self.assertIsNone(failure, msg = parse)
+			self.assertEqual(_codes(route), ['BBBBB', 'XXXXB', 'PPPPP', 'XXXXA', 'AAAAA'],
+				msg = parse)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that the binary navdata cache reads back the same navaids and airways as were parsed, that
+#  caches of another format version or byte order are rejected, and that NavData.load() rebuilds a
+#  stale cache.
+
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+import navcache
+from navcache import CACHE_VERSION, NavTables, packNavData
+from navdata import NavData
+from navgen import generate
+
+# Offsets of the version and byte order marker in the cache header, after the magic
+_VERSION_OFFSET = 8
+_BYTE_ORDER_OFFSET = 12
+
+class NavCacheTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._directory = tempfile.TemporaryDirectory()
+		cls.path = cls._directory.name
+		generate(cls.path, fixes = 400, navaids = 60, airways = 25, airwayLength = (3, 10),
+			airports = 30, seed = 3)
+		with contextlib.redirect_stderr(io.StringIO()):
+			cls.navdata = NavData(cls.path)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._directory.cleanup()
+
+	def setUp(self):
+		self.cachePath = os.path.join(self.path, 'navdata.cache')
+		self._stderr = contextlib.redirect_stderr(io.StringIO())
+		self._stderr.__enter__()
+
+	def tearDown(self):
+		self._stderr.__exit__(None, None, None)
+		if os.path.exists(self.cachePath):
+			os.remove(self.cachePath)
+
+	def assertSameNavData(self, navdata):
+		expected = self.navdata
+		self.assertEqual(sorted(navdata.navaids), sorted(expected.navaids))
+		for code, navaids in expected.navaids.items():
+			self.assertEqual([navaid.copy() for navaid in navdata.navaids[code]], navaids, msg = code)
+		self.assertEqual(sorted(navdata.airways), sorted(expected.airways))
+		for code, airways in expected.airways.items():
+			found = navdata.airways[code]
+			self.assertEqual(len(found), len(airways), msg = code)
+			for airway, expectedAirway in zip(found, airways):
+				self.assertEqual(airway['code'], expectedAirway['code'])
+				self.assertEqual(airway['high'], expectedAirway['high'])
+				self.assertEqual([(waypoint['base'], waypoint['top'], waypoint['navaid'].copy())
+					for waypoint in airway['waypoints']],
+					[(waypoint['base'], waypoint['top'], waypoint['navaid'])
+					for waypoint in expectedAirway['waypoints']], msg = code)
+
+	def testPackRoundTrip(self):
+		tables = NavTables(packNavData(self.navdata.navaids, self.navdata.airways, { }))
+		self.assertEqual(tables.version, CACHE_VERSION)
+		self.assertSameNavData(tables)
+		self.assertNotIn('NOSUCH', tables.navaids)
+		self.assertNotIn('NOSUCH', tables.airways)
+		self.assertRaises(KeyError, lambda: tables.navaids['NOSUCH'])
+
+	def testSaveAndOpen(self):
+		self.navdata.saveCache(self.cachePath)
+		navdata = NavData.open(self.cachePath)
+		self.assertSameNavData(navdata)
+		self.assertTrue(navdata.cacheCurrent(self.path))
+
+	def testIdentHashCollisions(self):
+		# Few slots for the number of idents, so that the probing runs through many of them
+		codes = ['ID{0:03d}'.format(n) for n in range(200)]
+		navaids = dict((code, [dict(type = 'fix', coords = (n, -n), code = code)])
+			for n, code in enumerate(codes))
+		tables = NavTables(packNavData(navaids, { }, { }))
+		for n, code in enumerate(codes):
+			self.assertEqual(tables.navaids[code][0]['coords'], (n, -n))
+		self.assertEqual(sorted(tables.navaids), codes)
+
+	def _patchHeader(self, offset, value):
+		data = bytearray(packNavData(self.navdata.navaids, self.navdata.airways, { }))
+		struct.pack_into('=I', data, offset, value)
+		return bytes(data)
+
+	def testWrongVersion(self):
+		data = self._patchHeader(_VERSION_OFFSET, CACHE_VERSION + 1)
+		with self.assertRaisesRegex(ValueError, 'version'):
+			NavTables(data)
+
+	def testWrongByteOrder(self):
+		data = self._patchHeader(_BYTE_ORDER_OFFSET,
+			struct.unpack('<I', struct.pack('>I', navcache._BYTE_ORDER))[0])
+		with self.assertRaisesRegex(ValueError, 'byte order'):
+			NavTables(data)
+
+	def testNotACache(self):
+		with self.assertRaises(ValueError):
+			NavTables(b'not a cache' * 100)
+		with self.assertRaises(ValueError):
+			NavTables(b'')
+
+	def testLoadRejectsOtherVersion(self):
+		with open(self.cachePath, 'wb') as f:
+			f.write(self._patchHeader(_VERSION_OFFSET, CACHE_VERSION + 1))
+		navdata = NavData.load(self.path)
+		self.assertIsNone(navdata._tables)
+		self.assertSameNavData(navdata)
+		# Rewritten in the current version
+		self.assertEqual(NavTables.open(self.cachePath).version, CACHE_VERSION)
+
+	def testLoadUsesCurrentCache(self):
+		NavData.load(self.path)
+		navdata = NavData.load(self.path)
+		self.assertIsNotNone(navdata._tables)
+		self.assertSameNavData(navdata)
+
+	def testTouchedSourceIsCurrent(self):
+		NavData.load(self.path)
+		# A new modification time with the same contents is caught by the hash
+		fixPath = os.path.join(self.path, 'earth_fix.dat')
+		st = os.stat(fixPath)
+		os.utime(fixPath, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+		self.assertIsNotNone(NavData.load(self.path)._tables)
+
+	def testStaleCacheRebuilt(self):
+		NavData.load(self.path)
+		fixPath = os.path.join(self.path, 'earth_fix.dat')
+		with open(fixPath, 'rb') as f:
+			original = f.read()
+		st = os.stat(fixPath)
+		try:
+			for data in (
+				# Same size, so only the modification time and hash show the change
+				self._renameFix(original),
+				# Another size
+				original.replace(b'\n99\n', b'\n 10.000000  20.000000 NEWFX\n99\n')):
+				with open(fixPath, 'wb') as f:
+					f.write(data)
+				os.utime(fixPath, ns = (st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+				navdata = NavData.load(self.path)
+				self.assertIsNone(navdata._tables)
+				with contextlib.redirect_stderr(io.StringIO()):
+					expected = NavData(self.path)
+				self.assertEqual(sorted(navdata.navaids), sorted(expected.navaids))
+				self.assertNotEqual(sorted(navdata.navaids), sorted(self.navdata.navaids))
+				# The rebuilt cache is current
+				rebuilt = NavData.open(self.cachePath)
+				self.assertTrue(rebuilt.cacheCurrent(self.path))
+				self.assertEqual(sorted(rebuilt.navaids), sorted(expected.navaids))
+		finally:
+			with open(fixPath, 'wb') as f:
+				f.write(original)
+			os.utime(fixPath, ns = (st.st_atime_ns, st.st_mtime_ns))
+
+	# Gives the last fix in fix.dat a new ident of the same length
+	def _renameFix(self, data):
+		lines = data.split(b'\n')
+		n = lines.index(b'99') - 1
+		ident = lines[n].split()[2]
+		lines[n] = lines[n][:-len(ident)] + b'Q' * len(ident)
+		return b'\n'.join(lines)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that NavData.applyUpdate() leaves the navdata the same as loading the updated files afresh,
+#  with the data parsed, compact, or with airports parsed lazily, and that it reports the codes it
+#  added, removed and modified.
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from navdata import NavData
+from navgen import generate
+
+# Modes to load the navdata in, as NavData arguments
+MODES = [
+	dict(),
+	dict(compact = True),
+	dict(lazyAirports = True),
+]
+
+def _readLines(path, file):
+	with open(os.path.join(path, file)) as f:
+		return f.read().split('\n')
+
+def _writeLines(path, file, lines):
+	with open(os.path.join(path, file), 'w') as f:
+		f.write('\n'.join(lines))
+
+# Copies the navaids and airways of navdata into plain dicts and lists, so that parsed and compact
+# navdata can be compared
+def _plain(navdata):
+	navaids = dict((code, [dict(navaid) for navaid in navaids])
+		for code, navaids in dict(navdata.navaids).items())
+	airways = dict((code, [dict(code = airway['code'], high = airway['high'], waypoints = [
+		dict(base = waypoint['base'], top = waypoint['top'], navaid = dict(waypoint['navaid']))
+		for waypoint in airway['waypoints']]) for airway in airways])
+		for code, airways in navdata.airways.items())
+	return navaids, airways
+
+class ApplyUpdateTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls._directory = tempfile.TemporaryDirectory()
+		cls.oldPath = os.path.join(cls._directory.name, 'old')
+		cls.newPath = os.path.join(cls._directory.name, 'new')
+		os.mkdir(cls.oldPath)
+		generate(cls.oldPath, fixes = 400, duplicates = 0, navaids = 60, airways = 25,
+			airwayLength = (3, 10), airports = 30, seed = 5)
+		shutil.copytree(cls.oldPath, cls.newPath)
+		cls.expected = cls._modify(cls.newPath)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls._directory.cleanup()
+
+	def setUp(self):
+		self._stderr = contextlib.redirect_stderr(io.StringIO())
+		self._stderr.__enter__()
+
+	def tearDown(self):
+		self._stderr.__exit__(None, None, None)
+
+	# Edits the files in path: removes a fix, moves another, adds a new one, changes a navaid's
+	# frequency, and removes, changes and adds an airway. Returns the expected report.
+	@classmethod
+	def _modify(cls, path):
+		awyLines = _readLines(path, 'earth_awy.dat')
+		awyFixes = set()
+		for line in awyLines[3:-2]:
+			tokens = line.split()
+			awyFixes.update((tokens[0], tokens[3]))
+
+		fixLines = _readLines(path, 'earth_fix.dat')
+		free = [n for n in range(3, len(fixLines) - 2) if fixLines[n].split()[2] not in awyFixes]
+		removedFix, movedFix = fixLines[free[0]].split()[2], fixLines[free[1]].split()[2]
+		lat, lon, ident = fixLines[free[1]].split()
+		fixLines[free[1]] = '{0:11.6f} {1:11.6f} {2}'.format(float(lat) + 1, float(lon), ident)
+		del fixLines[free[0]]
+		fixLines.insert(-2, '{0:11.6f} {1:11.6f} {2}'.format(12.5, 34.5, 'NEWFX'))
+		_writeLines(path, 'earth_fix.dat', fixLines)
+
+		navLines = _readLines(path, 'earth_nav.dat')
+		n = next(n for n in range(3, len(navLines) - 2) if navLines[n].split()[0] == '3')
+		tokens = navLines[n].split(' ')
+		tokens[4] = str(int(tokens[4]) + 5)
+		navaid = tokens[7]
+		navLines[n] = ' '.join(tokens)
+		_writeLines(path, 'earth_nav.dat', navLines)
+
+		# Segments shared by several airways list them all, joined with hyphens
+		airways = sorted(set(airway for line in awyLines[3:-2]
+			for airway in line.split()[-1].split('-')))
+		removedAirway = airways[0]
+		for n in range(3, len(awyLines) - 2):
+			tokens = awyLines[n].split()
+			tokens[-1] = '-'.join(airway for airway in tokens[-1].split('-')
+				if airway != removedAirway)
+			awyLines[n] = ' '.join(tokens) if tokens[-1] else None
+		awyLines = [line for line in awyLines if line is not None]
+		n = next(n for n in range(3, len(awyLines) - 2) if '-' not in awyLines[n].split()[-1])
+		tokens = awyLines[n].split()
+		tokens[8] = str(int(tokens[8]) + 10)
+		modifiedAirway = tokens[-1]
+		awyLines[n] = ' '.join(tokens)
+		first = awyLines[3].split()
+		awyLines.insert(-2, '{0} {1} {2} NEWFX 12.500000 34.500000 1 50 180 Q999'.format(
+			*first[:3]))
+		_writeLines(path, 'earth_awy.dat', awyLines)
+
+		return dict(
+			navaids = dict(added = ['NEWFX'], removed = [removedFix],
+				modified = sorted([movedFix, navaid])),
+			airways = dict(added = ['Q999'], removed = [removedAirway],
+				modified = [modifiedAirway]))
+
+	def testUpdate(self):
+		for mode in MODES:
+			navdata = NavData(self.oldPath, **mode)
+			report = navdata.applyUpdate(self.newPath)
+			self.assertEqual(dict((kind, dict((change, sorted(codes))
+				for change, codes in changes.items())) for kind, changes in report.items()),
+				self.expected, msg = mode)
+			self.assertEqual(_plain(navdata), _plain(NavData(self.newPath, **mode)), msg = mode)
+			self.assertEqual(navdata.path, self.newPath)
+
+	def testNoChanges(self):
+		for mode in MODES:
+			navdata = NavData(self.oldPath, **mode)
+			report = navdata.applyUpdate(self.oldPath)
+			self.assertFalse(any(report['navaids'].values()), msg = mode)
+			self.assertFalse(any(report['airways'].values()), msg = mode)
+			self.assertEqual(_plain(navdata), _plain(NavData(self.oldPath, **mode)), msg = mode)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that the navdata parsers read well formed files and reject rows with the wrong number of
+#  tokens, including rows whose extra and missing tokens balance out over the file.
+
+import os
+import tempfile
+import unittest
+
+from navparse import parseChunk
+
+FIX_HEADER = b'I\n600 Version - test\n\n'
+AWY_HEADER = b'I\n640 Version - test\n\n'
+
+class ParseTest(unittest.TestCase):
+	def setUp(self):
+		self._directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self._directory.cleanup()
+
+	def _parse(self, file, data):
+		path = os.path.join(self._directory.name, file)
+		with open(path, 'wb') as f:
+			f.write(data)
+		return parseChunk(path)
+
+	def testFix(self):
+		type, records, finished = self._parse('earth_fix.dat',
+			FIX_HEADER + b' 1.500000  -2.250000 ABCDE\n\n-3.000000 4.000000 FGHIJ\n99\n')
+		self.assertEqual(type, 'fix')
+		self.assertTrue(finished)
+		self.assertEqual(records, [
+			dict(type = 'fix', coords = (1.5, -2.25), code = 'ABCDE'),
+			dict(type = 'fix', coords = (-3.0, 4.0), code = 'FGHIJ')])
+
+	def testFixTokensBalanced(self):
+		# A row with a token too many and one with a token too few have the right number of tokens
+		# between them, but the columns would be out of line
+		with self.assertRaisesRegex(ValueError, 'Line 5: Incorrect number of tokens. Got 2'):
+			self._parse('earth_fix.dat', FIX_HEADER + b' 1.0 2.0 ABC 5\n 3.0 4.0\n99\n')
+
+	def testFixTooFewTokens(self):
+		with self.assertRaisesRegex(ValueError, 'Line 5: Incorrect number of tokens'):
+			self._parse('earth_fix.dat', FIX_HEADER + b' 1.0 2.0 ABC\n 3.0 DEF\n 5.0 6.0 GHI\n99\n')
+
+	def testFixBadNumber(self):
+		with self.assertRaises(ValueError):
+			self._parse('earth_fix.dat', FIX_HEADER + b' 1.0 2.0 ABC\n 3.0 X DEF\n99\n')
+
+	def testAwy(self):
+		type, records, finished = self._parse('earth_awy.dat', AWY_HEADER +
+			b'ABCDE 1.000000 2.000000 FGHIJ 3.000000 4.000000 2 180 460 J1-J2\n99\n')
+		self.assertEqual(type, 'awy')
+		self.assertEqual(len(records), 1)
+		idents, segment = records[0]
+		self.assertEqual(list(idents), ['J1', 'J2'])
+		self.assertEqual((segment['high'], segment['base'], segment['top']), (True, 180, 460))
+
+	def testAwyTokensBalanced(self):
+		with self.assertRaisesRegex(ValueError, 'Line 5: Incorrect number of tokens. Got 9'):
+			self._parse('earth_awy.dat', AWY_HEADER +
+				b'ABCDE 1.0 2.0 FGHIJ 3.0 4.0 1 50 180 V1 7\n'
+				b'ABCDE 1.0 2.0 FGHIJ 3.0 4.0 1 50 180\n99\n')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that RouteServer answers a request line longer than the stream limit with an error and
+#  goes on to answer the requests after it on the same connection.
+
+import asyncio
+import json
+import unittest
+
+from server import RouteServer
+
+class ConnectionTest(unittest.TestCase):
+	# Sends data on a connection to a server, then closes its end and returns the replies
+	async def _exchange(self, data):
+		server = await asyncio.start_server(RouteServer(None)._connection, '127.0.0.1', 0)
+		async with server:
+			reader, writer = await asyncio.open_connection(
+				*server.sockets[0].getsockname()[:2])
+			writer.write(data)
+			await writer.drain()
+			writer.write_eof()
+			replies = [json.loads(line) for line in (await reader.read()).splitlines()]
+			writer.close()
+			return replies
+
+	def testTooLong(self):
+		for line in (b'{"id": 1, "route": "' + b'A' * 100000 + b'"}\n',
+			b'x' * 200000 + b'\n', b'\n' + b'x' * 65537 + b'\n'):
+			replies = asyncio.run(self._exchange(line + b'{"id": 2, "op": "none"}\n'))
+			self.assertEqual([(reply['id'], reply['ok'], reply['error']) for reply in replies],
+				[(None, False, 'request too long'), (2, False, "unknown op 'none'")])
+
+	def testTooLongAtEnd(self):
+		replies = asyncio.run(self._exchange(b'{"id": 2, "op": "none"}\n' + b'x' * 100000))
+		self.assertEqual([reply['error'] for reply in replies],
+			["unknown op 'none'", 'request too long'])
+
+	def testLastLineUnterminated(self):
+		replies = asyncio.run(self._exchange(b'{"id": 3, "op": "none"}'))
+		self.assertEqual([reply['id'] for reply in replies], [3])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+## Checks that a navdata published into shared memory can be attached to from another process, and
+#  that the block outlives that process for as long as the publisher keeps it.
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+
+from navdata import NavData
+from navgen import write
+
+# Attaches to the block named by the first argument and prints the codes along AW1 from AAAAA
+CHILD = '''
+import sys
+from navdata import NavData
+navdata = NavData.attach(sys.argv[1])
+waypoints, airway = navdata.findAirway('AW1', navdata.nearestNavaids('AAAAA', (0, 0))[0], 'CCCCC')
+print(' '.join(leg.navaid['code'] for leg in waypoints))
+'''
+
+class AttachTest(unittest.TestCase):
+	def setUp(self):
+		self._directory = tempfile.TemporaryDirectory()
+		a, b, c = (0, 0, 'AAAAA'), (0, 1, 'BBBBB'), (0, 2, 'CCCCC')
+		write(self._directory.name, [a, b, c], [
+			((a, b), False, 50, 180, 'AW1'),
+			((b, c), False, 50, 180, 'AW1')])
+		with contextlib.redirect_stderr(io.StringIO()):
+			self.navdata = NavData(self._directory.name)
+		self.block = self.navdata.publish()
+
+	def tearDown(self):
+		self.block.close()
+		self.block.unlink()
+		self._directory.cleanup()
+
+	def testChildProcess(self):
+		# Once the output is read to its end the child's resource tracker, which shares its stderr,
+		# has exited too, having unlinked whatever was still registered with it
+		for run in range(2):
+			child = subprocess.run([sys.executable, '-c', CHILD, self.block.name],
+				capture_output = True, text = True, cwd = os.path.dirname(os.path.abspath(__file__)))
+			self.assertEqual(child.returncode, 0, msg = child.stderr)
+			self.assertEqual(child.stdout.split(), ['BBBBB', 'CCCCC'])
+			self.assertNotIn('leaked', child.stderr)
+			# Raises FileNotFoundError if the block was unlinked
+			shared_memory.SharedMemory(self.block.name).close()
+
+if __name__ == '__main__':
+	unittest.main()